@@ -0,0 +1,71 @@
+"""Time of batch_gcd against pairwise gcds over a corpus of moduli with a few
+planted shared primes, in memory, with the tree levels spilled to disk and
+with worker processes.
+
+Run from the root of the repo: python bench/batch_gcd.py [bits]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools.rsa import batch_gcd
+from cryptools.cryptomath import gcd
+
+def factor(bits):
+    # not prime, so unrelated moduli may share small factors too; the cost
+    # of the gcds is the same
+    return random.getrandbits(bits) | (1 << bits - 1) | 1
+
+def corpus(count, bits, shared=4):
+    moduli = [factor(bits // 2) * factor(bits // 2) for _ in range(count)]
+    planted = set()
+    for _ in range(shared):
+        i, j = random.sample(range(count), 2)
+        p = factor(bits // 2)
+        moduli[i] = p * factor(bits // 2)
+        moduli[j] = p * factor(bits // 2)
+        planted.update([i, j])
+    return moduli, planted
+
+def pairwise(moduli):
+    hits = set()
+    for i in xrange(len(moduli)):
+        for j in xrange(i + 1, len(moduli)):
+            if gcd(moduli[i], moduli[j]) > 1:
+                hits.update([i, j])
+    return hits
+
+def timed(f, *args):
+    start = time.time()
+    result = f(*args)
+    return result, time.time() - start
+
+def main(bits=1024):
+    spill_dir = tempfile.mkdtemp()
+    print '%-8s %10s %10s %10s %10s' % ('moduli', 'pairwise', 'batch', 'spilled', '2 workers')
+    try:
+        for count in [250, 1000, 4000]:
+            moduli, planted = corpus(count, bits)
+            expected = None
+            pair_time = '%10s' % '-'
+            if count <= 250:
+                expected, pair_time = timed(pairwise, moduli)
+                pair_time = '%9.2fs' % pair_time
+            times = []
+            for workers, spill in [(None, None), (None, spill_dir), (2, None)]:
+                gcds, t = timed(batch_gcd, moduli, workers, spill)
+                hits = set(i for i, g in enumerate(gcds) if g > 1)
+                assert hits >= planted and hits == (expected or hits)
+                expected = hits
+                times.append(t)
+            print '%-8d %s %9.2fs %9.2fs %9.2fs' % ((count, pair_time) + tuple(times))
+    finally:
+        shutil.rmtree(spill_dir)
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
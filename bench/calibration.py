@@ -0,0 +1,79 @@
+"""Oracle queries and wall clock time of ECB oracle calibration (block size,
+padding and prefix size): the original one byte at a time probing against
+ecb_calibrate, serially and with concurrent probes.
+
+Every oracle query sleeps for LATENCY seconds to model a remote oracle.
+
+Run from the root of the repo: python bench/calibration.py
+"""
+import os
+import sys
+import time
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Crypto.Cipher import AES
+from cryptools.block import ecb_calibrate, is_ecb_mode, pkcs7_pad, _prefix_similarity
+
+KEY = os.urandom(16)
+SECRET = "Rollin' in my 5.0\nWith my rag-top down so my hair can blow\n"
+LATENCY = 0.005
+
+class CountingOracle(object):
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        time.sleep(LATENCY)
+        return AES.new(KEY, AES.MODE_ECB).encrypt(pkcs7_pad(self.prefix + data + SECRET))
+
+def baseline_block_size_padding(oracle):
+    last = oracle('')
+    for i in itertools.count(1):
+        current = oracle('A'*i)
+        if len(current) > len(last):
+            last = current
+            break
+        last = current
+    for size in [8, 16, 24, 32]:
+        if len(oracle('A'*(i+size))) > len(last):
+            return (size, i)
+
+def baseline_prefix_size(oracle, block_size=16):
+    last = oracle('')
+    target_sim = 0
+    for i in itertools.count(1):
+        current = oracle('A'*i)
+        sim = _prefix_similarity(current, last)
+        if sim >= block_size:
+            if i == 1:
+                target_sim = block_size*(sim/block_size) + block_size
+            elif sim > target_sim:
+                if _prefix_similarity(oracle('B'*i), oracle('B'*(i-1))) > target_sim:
+                    return block_size*(sim/block_size)-i+1
+        last = current
+
+def baseline(oracle):
+    is_ecb_mode(oracle('A'*48))
+    baseline_block_size_padding(oracle)
+    return baseline_prefix_size(oracle)
+
+def main():
+    print '%-8s %-22s %8s %10s' % ('prefix', 'method', 'queries', 'seconds')
+    for prefix_len in [0, 7, 30]:
+        prefix = os.urandom(prefix_len)
+        methods = [('one byte at a time', baseline),
+                   ('batch, serial', lambda o: ecb_calibrate(o).prefix_size),
+                   ('batch, 16 workers', lambda o: ecb_calibrate(o, workers=16).prefix_size),
+                   ('batch, 70 workers', lambda o: ecb_calibrate(o, workers=70).prefix_size)]
+        for name, f in methods:
+            oracle = CountingOracle(prefix)
+            start = time.time()
+            assert f(oracle) == prefix_len
+            print '%-8d %-22s %8d %10.2f' % (prefix_len, name, oracle.calls, time.time() - start)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Time per call of the cryptomath functions against the original pure
+Python implementations, for 512 to 8192-bit operands, with the backend in
+use (gmpy2 if installed).
+
+Run from the root of the repo: python bench/cryptomath.py
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools import cryptomath as m
+
+def baseline_iroot(n, r):
+    u, s = n, n+1
+    while u < s:
+        s = u
+        t = (r-1) * s + n // pow(s, r-1)
+        u = t // r
+    return s
+
+def baseline_isqrt(n):
+    x = n
+    y = (x + 1) // 2
+    while y < x:
+        x = y
+        y = (x + n // x) // 2
+    return x
+
+def baseline_egcd(b, n):
+    x0, x1, y0, y1 = 1, 0, 0, 1
+    while n != 0:
+        q, b, n = b // n, n, b % n
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return  b, x0, y0
+
+def baseline_modinv(b, n):
+    g, x, _ = baseline_egcd(b, n)
+    if g == 1:
+        return x % n
+
+def baseline_crt(n, a):
+    x = 0
+    prod = reduce(lambda a, b: a*b, n)
+    for n_i, a_i in zip(n, a):
+        p = prod / n_i
+        x += a_i * baseline_modinv(p, n_i) * p
+    return x % prod
+
+def timed(f, args, reps):
+    start = time.time()
+    for _ in xrange(reps):
+        result = f(*args)
+    return result, (time.time() - start) / reps * 1e6
+
+def odd(bits):
+    return random.getrandbits(bits) | (1 << bits - 1) | 1
+
+def main(reps=5):
+    print 'backend: %s' % m.BACKEND
+    print '%-6s %-12s %12s %12s %8s' % ('bits', 'operation', 'baseline', 'cryptomath', 'speedup')
+    for bits in [512, 1024, 2048, 4096, 8192]:
+        moduli = [odd(bits) for _ in range(3)]
+        while m.gcd(moduli[0], moduli[1]) != 1 or m.gcd(moduli[2], moduli[0] * moduli[1]) != 1:
+            moduli = [odd(bits) for _ in range(3)]
+        x = random.getrandbits(bits)
+        residues = [pow(x, 3, n_i) for n_i in moduli]
+        solver = m.CRT(moduli)
+        cases = [
+            ('isqrt', baseline_isqrt, m.isqrt, (odd(2 * bits),)),
+            ('iroot 3', baseline_iroot, m.iroot, (x ** 3, 3)),
+            ('egcd', baseline_egcd, m.egcd, tuple(moduli[:2])),
+            ('modinv', baseline_modinv, m.modinv, tuple(moduli[:2])),
+            ('crt 3', baseline_crt, m.crt, (moduli, residues)),
+            ('CRT.solve 3', baseline_crt, lambda n, a: solver.solve(a), (moduli, residues)),
+        ]
+        for name, baseline, f, args in cases:
+            expected, base_time = timed(baseline, args, reps)
+            result, t = timed(f, args, reps)
+            if name != 'egcd':
+                assert result == expected, name
+            print '%-6d %-12s %10.1fus %10.1fus %7.1fx' % (bits, name, base_time, t, base_time / t)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Throughput of aes_ctr_encrypt against the original per block counter
+callback, of random access decryption with AesCtr.seek and of the file
+streaming functions.
+
+Run from the root of the repo: python bench/ctr.py
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Crypto.Cipher import AES
+
+from cryptools import commons
+from cryptools.block import AesCtr, aes_ctr_encrypt, aes_ctr_encrypt_file, aes_ctr_decrypt_file
+from cryptools.commons import le_cyclic_counter, le_counter_blocks, nxor, LONG_LONG_LIMIT
+
+MB = 1 << 20
+
+def baseline_encrypt(key, pt, nonce):
+    ctr = le_cyclic_counter()
+    counter = lambda: nonce + ctr()
+    try:
+        return nonce + AES.new(key, AES.MODE_CTR, counter=counter).encrypt(pt)
+    except TypeError:
+        # PyCryptodome doesn't take counter functions: same callback, ECB per block
+        ecb = AES.new(key, AES.MODE_ECB)
+        ks = ''.join(ecb.encrypt(counter()) for _ in xrange(-(-len(pt) // 16)))
+        return nonce + nxor(pt, ks)
+
+def counter_check(count=4):
+    """Counter blocks against le_cyclic_counter in the upper half of the
+    counter range and across the wrap, with and without NumPy.
+    """
+    np = commons.np
+    try:
+        for commons.np in [np, None]:
+            for prefix in ['\x00' * 8, 'nonce']:
+                for start in [0, 1 << 63, LONG_LONG_LIMIT - 1]:
+                    ctr = le_cyclic_counter(start)
+                    expected = ''.join(prefix + ctr() for _ in range(count))
+                    assert le_counter_blocks(prefix, start, count) == expected
+    finally:
+        commons.np = np
+    print 'counter blocks ok, NumPy %s' % ('available' if np is not None else 'missing')
+
+def rate(size, seconds):
+    return '%8.1fMB/s' % (size / float(MB) / seconds)
+
+def timed(f, *args):
+    start = time.time()
+    result = f(*args)
+    return result, time.time() - start
+
+def throughput():
+    key, nonce = os.urandom(16), os.urandom(8)
+    print '%-8s %12s %12s' % ('size', 'baseline', 'AesCtr')
+    for size in [MB, 16 * MB]:
+        pt = os.urandom(size)
+        ct, t = timed(aes_ctr_encrypt, key, pt, nonce)
+        if size <= MB:
+            expected, base_time = timed(baseline_encrypt, key, pt, nonce)
+            assert ct == expected
+            base = rate(size, base_time)
+        else:
+            base = '%12s' % '-'
+        print '%-8s %s %s' % ('%dMB' % (size // MB), base, rate(size, t))
+
+def random_access(reads=10000, size=64 * MB, length=100):
+    key, nonce = os.urandom(16), os.urandom(8)
+    ct = AesCtr(key, nonce).encrypt(os.urandom(size))
+    cipher = AesCtr(key, nonce)
+    start = time.time()
+    for _ in xrange(reads):
+        offset = random.randrange(size - length)
+        cipher.seek(offset)
+        cipher.decrypt(ct[offset:offset + length])
+    print '%d random %d byte reads of a %dMB message: %.1fus each' % (
+        reads, length, size // MB, (time.time() - start) / reads * 1e6)
+
+def streaming(size=64 * MB):
+    key = os.urandom(16)
+    path = tempfile.mktemp()
+    try:
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        with open(path, 'rb') as src, open(path + '.enc', 'wb') as dst:
+            _, enc_time = timed(aes_ctr_encrypt_file, key, src, dst)
+        with open(path + '.enc', 'rb') as src, open(path + '.dec', 'wb') as dst:
+            _, dec_time = timed(aes_ctr_decrypt_file, key, src, dst)
+        with open(path, 'rb') as a, open(path + '.dec', 'rb') as b:
+            assert a.read() == b.read()
+        print '%dMB file: encrypt %s, decrypt %s' % (size // MB, rate(size, enc_time), rate(size, dec_time))
+    finally:
+        for p in [path, path + '.enc', path + '.dec']:
+            if os.path.exists(p):
+                os.remove(p)
+
+if __name__ == '__main__':
+    counter_check()
+    throughput()
+    print
+    random_access()
+    streaming()
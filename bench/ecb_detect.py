@@ -0,0 +1,59 @@
+"""Speed of is_ecb_mode against the original overlapping block version, and
+of ecb_scan over a file of hex ciphertexts with and without a process pool.
+
+Run from the root of the repo: python bench/ecb_detect.py
+"""
+import os
+import sys
+import time
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Crypto.Cipher import AES
+from cryptools.block import is_ecb_mode, ecb_scan
+
+KEY = os.urandom(16)
+
+def baseline_is_ecb_mode(ct, block_size=16, threshold=1):
+    blocks = defaultdict(int)
+    for i in xrange(0, len(ct)-block_size):
+        blocks[ct[i:i+block_size]] += 1
+    return sum(blocks.values()) >= len(blocks)+threshold
+
+def timed(f, *args):
+    start = time.time()
+    result = f(*args)
+    return result, time.time() - start
+
+def detection():
+    print '%10s %12s %12s' % ('bytes', 'original', 'aligned')
+    for size in [1 << 10, 1 << 16, 1 << 20, 1 << 22]:
+        ct = AES.new(KEY, AES.MODE_CBC, os.urandom(16)).encrypt(os.urandom(size))
+        expected, baseline_time = timed(baseline_is_ecb_mode, ct)
+        result, new_time = timed(is_ecb_mode, ct)
+        assert result == expected == False
+        print '%10d %11.3fs %11.3fs' % (size, baseline_time, new_time)
+
+def scanning(lines=20000, size=4096):
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for i in range(lines):
+                if i % 1000 == 0:
+                    ct = AES.new(KEY, AES.MODE_ECB).encrypt(os.urandom(16) * (size / 16))
+                else:
+                    ct = AES.new(KEY, AES.MODE_CBC, os.urandom(16)).encrypt(os.urandom(size))
+                f.write(ct.encode('hex') + '\n')
+        print
+        print '%-10s %8s %10s' % ('workers', 'found', 'seconds')
+        for workers in [None, 2, 4]:
+            ranked, elapsed = timed(ecb_scan, path, 16, 'hex', workers)
+            print '%-10s %8d %10.2f' % (workers or '-', sum(1 for r in ranked if r[1] > 0), elapsed)
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    detection()
+    scanning()
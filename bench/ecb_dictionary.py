@@ -0,0 +1,45 @@
+"""Oracle calls and wall clock time of ecb_oracle_decrypt, one query per
+candidate versus dictionary mode.
+
+Every oracle query sleeps for LATENCY seconds to model a remote oracle.
+
+Run from the root of the repo: python bench/ecb_dictionary.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Crypto.Cipher import AES
+from cryptools.block import ecb_oracle_decrypt, pkcs7_pad
+
+KEY = os.urandom(16)
+PREFIX = os.urandom(13)
+SECRET = ("Rollin' in my 5.0\nWith my rag-top down so my hair can blow\n"
+          "The girlies on standby waving just to say hi\nDid you stop? No, I just drove by\n")
+LATENCY = 0.0005
+
+class CountingOracle(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        time.sleep(LATENCY)
+        return AES.new(KEY, AES.MODE_ECB).encrypt(pkcs7_pad(PREFIX + data + SECRET))
+
+def main():
+    print '%-24s %8s %10s' % ('mode', 'queries', 'seconds')
+    modes = [('per candidate', {}),
+             ('dictionary', {'dictionary': True}),
+             ('dictionary, 1024 limit', {'dictionary': True, 'max_input': 1024}),
+             ('dictionary, 256 limit', {'dictionary': True, 'max_input': 256})]
+    for name, kwargs in modes:
+        oracle = CountingOracle()
+        start = time.time()
+        assert ecb_oracle_decrypt(oracle, **kwargs) == SECRET
+        print '%-24s %8d %10.2f' % (name, oracle.calls, time.time() - start)
+
+if __name__ == '__main__':
+    main()
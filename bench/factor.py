@@ -0,0 +1,69 @@
+"""Time of every factoring method, and of factorize running them all in a
+process pool, on weak keys of various sizes: primes close together, p-1
+smooth, and a small prime factor. A method that doesn't apply runs until
+its time budget is out.
+
+Run from the root of the repo: python bench/factor.py [timeout]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Crypto.Util.number import getPrime, isPrime
+
+from cryptools.factor import METHODS, factorize, _primes
+from cryptools import cryptomath as m
+
+def next_prime(x):
+    x |= 1
+    while not isPrime(x):
+        x += 2
+    return x
+
+def close_primes(bits):
+    p = getPrime(bits // 2)
+    return p * next_prime(p + random.getrandbits(bits // 4))
+
+def smooth_pm1(bits, bound=1 << 16):
+    primes = _primes(bound)
+    while True:
+        # distinct primes, so that p-1 is `bound`-powersmooth
+        p = 2
+        for q in random.sample(primes, len(primes)):
+            if p.bit_length() >= bits // 2:
+                break
+            p *= q
+        if isPrime(p + 1):
+            return (p + 1) * getPrime(bits // 2)
+
+def small_factor(bits, small=32):
+    return getPrime(small) * getPrime(bits - small)
+
+WEAK_KEYS = [('close', close_primes), ('p-1 smooth', smooth_pm1), ('small p', small_factor)]
+
+def timed(f, *args, **kwargs):
+    start = time.time()
+    result = f(*args, **kwargs)
+    return result, time.time() - start
+
+def main(timeout=10):
+    print 'backend: %s, timeout %ds' % (m.BACKEND, timeout)
+    names = list(METHODS)
+    print '%-6s %-12s' % ('bits', 'key') + ''.join('%10s' % name for name in names) + '%14s' % 'factorize'
+    for bits in [512, 1024, 2048]:
+        for key, generate in WEAK_KEYS:
+            n = generate(bits)
+            row = '%-6d %-12s' % (bits, key)
+            for name in names:
+                p, t = timed(METHODS[name], n, deadline=time.time() + timeout)
+                assert p is None or n % p == 0
+                row += '%9.2fs' % t if p else '%10s' % '-'
+            result, t = timed(factorize, n, timeout=timeout, workers=len(names))
+            assert result is None or result[0] * result[1] == n
+            print row + '%9.2fs %-4s' % (t, result[2] if result else '-')
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""Correctness checks for the pure Python hashes registered in cryptools.hash,
+against hashlib (or PyCrypto for md4). Needs no network access.
+
+For every hash it compares digests of every length up to three blocks
+(covering the 55/56/64 byte padding boundaries, 111/112/128 for sha512),
+of random lengths and of randomly split incremental updates. It also checks
+length extension round-trips through sha1_extend, md4_extend and
+length_extend. Exits with a non zero status on the first mismatch.
+
+Run from the root of the repo: python bench/hash_check.py [rounds]
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools.hash import HASHES, sha1_extend, md4_extend, length_extend
+from hashes import reference
+
+def check(ok, what):
+    if not ok:
+        print 'FAIL', what
+        sys.exit(1)
+
+def check_digests(name, ref, rounds):
+    cls = HASHES[name]
+    bsize = cls.block_size
+    for n in range(3 * bsize + 1):
+        data = os.urandom(n)
+        check(cls().update(data).hexdigest() == ref(data).hexdigest(), '%s length %d' % (name, n))
+    for _ in range(rounds):
+        n = random.choice([random.randint(0, 1 << 16),
+                           random.randint(1, 64) * bsize + random.randint(-2, 2) - cls.length_size - 1])
+        n = max(n, 0)
+        data = os.urandom(n)
+        h = cls()
+        i = 0
+        while i < n:
+            j = i + random.randint(0, 2 * bsize)
+            h.update(data[i:j])
+            i = j
+        check(h.hexdigest() == ref(data).hexdigest(), '%s split update of length %d' % (name, n))
+        check(cls().update(data).hexdigest() == ref(data).hexdigest(), '%s length %d' % (name, n))
+
+def check_extend(name, ref, rounds, extend=None):
+    for _ in range(rounds):
+        key = os.urandom(random.randint(0, 3 * HASHES[name].block_size))
+        pt = os.urandom(random.randint(0, 100))
+        extension = os.urandom(random.randint(0, 300))
+        mac = ref(key + pt).hexdigest()
+        if extend is None:
+            m, h = length_extend(name, mac, pt, extension, prefix_len=len(key))
+        else:
+            m, h = extend(mac, pt, extension, prefix_len=len(key))
+        check(m.startswith(pt) and m.endswith(extension), '%s extended message' % name)
+        check(ref(key + m).hexdigest() == h,
+              '%s extension, key %d pt %d extension %d' % (name, len(key), len(pt), len(extension)))
+
+def main(rounds):
+    for name in sorted(HASHES):
+        ref = reference(name)
+        if ref is None:
+            print '%-8s skipped, no reference implementation' % name
+            continue
+        check_digests(name, ref, rounds)
+        check_extend(name, ref, rounds)
+        extend = {'sha1': sha1_extend, 'md4': md4_extend}.get(name)
+        if extend:
+            check_extend(name, ref, rounds, extend)
+        print '%-8s ok' % name
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,89 @@
+"""Throughput and per block latency of the pure Python hashes registered in
+cryptools.hash against hashlib, and the cost of a length_extend prefix
+length sweep for each.
+
+Inputs go from 0 bytes up to 64MB, which takes several minutes per hash;
+pass --max-size to stop earlier. Hashes hashlib lacks (md4 on recent
+OpenSSL builds) are compared against PyCrypto instead.
+
+Run from the root of the repo: python bench/hashes.py [--max-size BYTES] [algorithm ...]
+"""
+import os
+import sys
+import time
+import hashlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools.hash import HASHES, length_extend
+
+SIZES = [0, 64, 1 << 10, 1 << 16, 1 << 20, 1 << 24, 1 << 26]
+
+def reference(name):
+    """hashlib (or PyCrypto) constructor for `name`, or None if neither has it."""
+    try:
+        hashlib.new(name)
+        return lambda data=b'': hashlib.new(name, data)
+    except ValueError:
+        pass
+    try:
+        module = __import__('Crypto.Hash.' + name.upper(), fromlist=['new'])
+        return module.new
+    except ImportError:
+        return None
+
+def timed(f, data, min_time=0.2):
+    """Seconds per call of f(data).hexdigest(), repeating short runs."""
+    repeat = 0
+    start = time.time()
+    while True:
+        f(data).hexdigest()
+        repeat += 1
+        elapsed = time.time() - start
+        if elapsed >= min_time:
+            return elapsed / repeat
+
+def speed(name, max_size):
+    cls = HASHES[name]
+    ours = lambda data: cls().update(data)
+    ref = reference(name)
+    print '%-8s %10s %12s %12s %12s %8s' % (name, 'bytes', 'impl MB/s', 'us/block', 'ref MB/s', 'ratio')
+    for size in SIZES:
+        if size > max_size:
+            break
+        data = os.urandom(size)
+        blocks = len(data + cls.padding(size)) / cls.block_size
+        per_call = timed(ours, data)
+        mbs = size / per_call / (1 << 20)
+        line = '%-8s %10d %12.2f %12.1f' % ('', size, mbs, per_call / blocks * 1e6)
+        if ref is None:
+            print line, '%12s %8s' % ('-', '-')
+            continue
+        ref_call = timed(ref, data)
+        print line, '%12.2f %8.0f' % (size / ref_call / (1 << 20), per_call / ref_call)
+
+def sweep(name):
+    mac_of = reference(name) or (lambda data: HASHES[name]().update(data))
+    key = os.urandom(600)
+    pt = 'user=guest'
+    mac = mac_of(key + pt).hexdigest()
+    oracle = lambda m, h: mac_of(key + m).hexdigest() == h
+    print '%-8s %10s %12s' % (name, 'extension', 'sweep time')
+    for ext_len in [16, 1 << 10, 1 << 14]:
+        extension = ';admin=true'.ljust(ext_len, 'A')
+        start = time.time()
+        assert length_extend(name, mac, pt, extension, oracle)
+        print '%-8s %10d %11.3fs' % ('', ext_len, time.time() - start)
+
+def main(args):
+    max_size = SIZES[-1]
+    if args[:1] == ['--max-size']:
+        max_size = int(args[1])
+        args = args[2:]
+    for name in args or sorted(HASHES):
+        speed(name, max_size)
+        sweep(name)
+        print
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+"""Time of batch_broadcast_attack over many e=3 broadcast groups sent to a
+few sets of keys, against the original crt/iroot, serially and with worker
+processes.
+
+Run from the root of the repo: python bench/hastad.py [groups]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools.rsa import batch_broadcast_attack
+from cryptools import cryptomath as m
+
+def baseline_iroot(n, r):
+    u, s = n, n+1
+    while u < s:
+        s = u
+        t = (r-1) * s + n // pow(s, r-1)
+        u = t // r
+    return s
+
+def baseline_crt(n, a):
+    x = 0
+    prod = reduce(lambda a, b: a*b, n)
+    for n_i, a_i in zip(n, a):
+        p = prod / n_i
+        x += a_i * m.modinv(p, n_i) * p
+    return x % prod
+
+def baseline_attack(pairs, e):
+    return baseline_iroot(baseline_crt([n for n, _ in pairs], [c for _, c in pairs]), e)
+
+def moduli(count, bits):
+    # coprime odd moduli are all the attack needs
+    result = []
+    while len(result) < count:
+        n = random.getrandbits(bits) | (1 << bits - 1) | 1
+        if all(m.gcd(n, x) == 1 for x in result):
+            result.append(n)
+    return result
+
+def captures(groups, bits, key_sets=10, e=3):
+    sets = [moduli(e, bits) for _ in range(key_sets)]
+    messages = {}
+    result = []
+    for label in range(groups):
+        messages[label] = random.getrandbits(bits - 8)
+        for n in sets[label % key_sets]:
+            result.append((label, (n, e), pow(messages[label], e, n)))
+    return result, messages
+
+def main(groups=1000):
+    print 'backend: %s' % m.BACKEND
+    print '%-6s %8s %12s %12s %10s %10s' % ('bits', 'groups', 'baseline', 'per attack', 'serial', '2 workers')
+    for bits in [1024, 2048, 4096]:
+        caps, messages = captures(groups, bits)
+        pairs = [(n, c) for label, (n, e), c in caps if label == 0]
+        start = time.time()
+        assert baseline_attack(pairs, 3) == messages[0]
+        baseline_time = time.time() - start
+        times = []
+        per_attack = None
+        for workers in [None, 2]:
+            start = time.time()
+            results = batch_broadcast_attack(caps, workers)
+            times.append(time.time() - start)
+            assert all(pt == messages[label] for label, _, pt, _ in results)
+            if per_attack is None:
+                per_attack = sum(r[3] for r in results) / len(results)
+        print '%-6d %8d %10.2fms %10.2fms %9.2fs %9.2fs' % (bits, groups, baseline_time * 1e3,
+                                                            per_attack * 1e3, times[0], times[1])
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,62 @@
+"""Oracle query counts of the padding oracle candidate ordering strategies.
+
+Run from the root of the repo: python bench/padding_oracle_order.py
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Crypto.Cipher import AES
+from cryptools.block import (cbc_padding_oracle_decrypt, pkcs7_pad, pkcs7_unpad,
+                             pkcs7_unpad_strict, printable_order, frequency_order, pkcs7_order)
+
+KEY = os.urandom(16)
+
+TEXT = ("It is a truth universally acknowledged, that a single man in possession "
+        "of a good fortune, must be in want of a wife.\nHowever little known the "
+        "feelings or views of such a man may be on his first entering a neighbourhood, "
+        "this truth is so well fixed in the minds of the surrounding families.")
+JSON = json.dumps({'user': 'admin', 'id': 1337, 'roles': ['read', 'write'],
+                   'session': {'expires': 1500000000, 'token': 'f00dfacecafebeef'},
+                   'comment': 'Nothing to see here'})
+BINARY = os.urandom(256)
+
+STRATEGIES = [
+    ('numeric', None),
+    ('printable', printable_order),
+    ('frequency', frequency_order),
+    ('pkcs7+frequency', pkcs7_order()),
+]
+
+class CountingOracle(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, ct):
+        self.calls += 1
+        pt = AES.new(KEY, AES.MODE_CBC, ct[:16]).decrypt(ct[16:])
+        try:
+            pkcs7_unpad_strict(pt)
+            return True
+        except Exception:
+            return False
+
+def encrypt(pt):
+    iv = os.urandom(16)
+    return iv + AES.new(KEY, AES.MODE_CBC, iv).encrypt(pkcs7_pad(pt))
+
+def main():
+    print '%-8s %-16s %8s %10s' % ('input', 'strategy', 'queries', 'per byte')
+    for name, pt in [('text', TEXT), ('json', JSON), ('binary', BINARY)]:
+        ct = encrypt(pt)
+        for sname, order in STRATEGIES:
+            oracle = CountingOracle()
+            result = cbc_padding_oracle_decrypt(ct, oracle, order=order)
+            assert pkcs7_unpad(result) == pt
+            print '%-8s %-16s %8d %10.1f' % (name, sname, oracle.calls,
+                                             oracle.calls / float(len(ct) - 16))
+
+if __name__ == '__main__':
+    main()
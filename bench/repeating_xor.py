@@ -0,0 +1,51 @@
+"""Speed of the pure Python and NumPy repeating key xor candidate search
+across ciphertext sizes, for a known key size. The pure Python version
+is skipped above PY_LIMIT bytes, where it takes minutes.
+
+Run from the root of the repo: python bench/repeating_xor.py
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools.analysis import _xor_key_candidate_py, _xor_key_candidate_np
+from cryptools.commons import sxor
+
+WORDS = ('the of and to in is was that for it with as his on be at by had are '
+         'but from or have an they which one you were her all she there would').split()
+
+PY_LIMIT = 1 << 14
+
+def english(size):
+    words = []
+    length = 0
+    while length < size:
+        words.append(random.choice(WORDS))
+        length += len(words[-1]) + 1
+    return ' '.join(words)[:size]
+
+def timed(f, *args):
+    start = time.time()
+    result = f(*args)
+    return result, time.time() - start
+
+def main():
+    key = 'YELLOW SUBMARINE'
+    print '%10s %10s %10s %8s' % ('bytes', 'python', 'numpy', 'speedup')
+    for size in [1 << 10, 1 << 14, 1 << 17, 1 << 20, 1 << 23]:
+        pt = english(size)
+        ct = sxor(pt, key * (size / len(key) + 1))
+        result, np_time = timed(_xor_key_candidate_np, ct, len(key))
+        assert result[1:] == (key, pt)
+        if size > PY_LIMIT:
+            print '%10d %10s %9.3fs %8s' % (size, '-', np_time, '-')
+            continue
+        expected, py_time = timed(_xor_key_candidate_py, ct, len(key))
+        assert result == expected
+        print '%10d %9.3fs %9.3fs %7.0fx' % (size, py_time, np_time, py_time / np_time)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Peak memory and time of the analysis entry points on a large ciphertext
+file, read in memory as a string versus memory mapped with map_file.
+
+Peak memory is the largest anonymous resident set (RssAnon in
+/proc/self/status, Linux only) of a fresh process running one function.
+Pages of a memory mapped file are left out: they belong to the page cache
+and the kernel drops them under memory pressure.
+
+Run from the root of the repo: python bench/streaming.py [megabytes]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools.analysis import repeating_xor_decrypt, count_ngrams, chi2_printable
+from cryptools.block import is_ecb_mode
+from cryptools.commons import map_file, xor_repeat
+
+WORDS = ('the of and to in is was that for it with as his on be at by had are '
+         'but from or have an they which one you were her all she there would').split()
+KEY = 'YELLOW SUBMARINE'
+
+def consume(result):
+    """Iterates over the plaintext of mapped input, keeping nothing."""
+    for key, plaintext in result:
+        if not isinstance(plaintext, str):
+            for _ in plaintext:
+                pass
+    return result
+
+FUNCTIONS = {
+    'repeating_xor_decrypt': lambda ct: consume(repeating_xor_decrypt(ct, top_results=1)),
+    'count_ngrams': lambda ct: count_ngrams(ct, 2),
+    'chi2_printable': chi2_printable,
+    'is_ecb_mode': is_ecb_mode,
+}
+
+def rss_anon():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+class PeakSampler(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.peak = rss_anon()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, rss_anon())
+            time.sleep(0.002)
+
+def child(name, mode, path):
+    baseline = rss_anon()
+    sampler = PeakSampler()
+    sampler.start()
+    start = time.time()
+    if mode == 'string':
+        with open(path, 'rb') as f:
+            ct = f.read()
+    else:
+        ct = map_file(path)
+    FUNCTIONS[name](ct)
+    elapsed = time.time() - start
+    sampler.running = False
+    sampler.join()
+    print (max(sampler.peak, rss_anon()) - baseline) / float(1 << 20), elapsed
+
+def write_ciphertext(path, size):
+    words = []
+    length = 0
+    while length < (1 << 16):
+        words.append(random.choice(WORDS))
+        length += len(words[-1]) + 1
+    block = ' '.join(words)[:1 << 16]
+    with open(path, 'wb') as f:
+        for _ in range(size / len(block)):
+            f.write(xor_repeat(block, KEY))
+
+def main(megabytes):
+    if not os.path.exists('/proc/self/status'):
+        print 'needs /proc/self/status (Linux)'
+        return
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        write_ciphertext(path, megabytes << 20)
+        print '%-22s %8s %12s %10s' % ('function', 'input', 'peak MB', 'seconds')
+        for name in sorted(FUNCTIONS):
+            for mode in ['string', 'mapped']:
+                out = subprocess.check_output([sys.executable, __file__, '--child', name, mode, path])
+                peak, elapsed = map(float, out.split())
+                print '%-22s %8s %12.1f %10.2f' % (name, mode, peak, elapsed)
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:5])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
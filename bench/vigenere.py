@@ -0,0 +1,95 @@
+"""Speed of the Vigenere functions against the original per character
+implementation, and key recovery rate of vigenere_crack.
+
+Run from the root of the repo: python bench/vigenere.py
+"""
+import os
+import sys
+import time
+import random
+import string
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools.analysis import vigenere_decrypt, vigenere_crack, NgramScorer
+
+WORDS = ('the of and to in is was that for it with as his on be at by had are '
+         'but from or have an they which one you were her all she there would '
+         'their we him been has when who will more no if out so said what up its').split()
+
+def english(size):
+    words = []
+    length = 0
+    while length < size:
+        words.append(random.choice(WORDS) + random.choice(' ' * 10 + ',.\n'))
+        length += len(words[-1])
+    return ''.join(words)[:size]
+
+def baseline_decrypt(ct, key, alphabet=string.ascii_lowercase):
+    ki = 0
+    pt = ''
+    for c in ct:
+        if c not in alphabet:
+            pt += c
+        else:
+            rot = (len(alphabet) - alphabet.index(key[ki])) % len(alphabet)
+            pt += alphabet[(alphabet.index(c) + rot) % len(alphabet)]
+            ki = (ki + 1) % len(key)
+    return pt
+
+def encrypt(pt, key):
+    inverse = ''.join(string.ascii_lowercase[-string.ascii_lowercase.index(k)] for k in key)
+    return vigenere_decrypt(pt, inverse)
+
+def random_key(length):
+    return ''.join(random.choice(string.ascii_lowercase) for _ in range(length))
+
+def speed():
+    print '%-10s %10s %10s %10s' % ('bytes', 'baseline', 'decrypt', 'crack')
+    for size in [1 << 10, 1 << 14, 1 << 18]:
+        key = random_key(11)
+        ct = encrypt(english(size), key)
+        start = time.time()
+        expected = baseline_decrypt(ct, key)
+        baseline_time = time.time() - start
+        start = time.time()
+        assert vigenere_decrypt(ct, key) == expected
+        decrypt_time = time.time() - start
+        start = time.time()
+        vigenere_crack(ct)
+        print '%-10d %9.3fs %9.3fs %9.3fs' % (size, baseline_time, decrypt_time, time.time() - start)
+
+def recovery(trials=20):
+    model = NgramScorer.from_corpus(english(1 << 16), 2)
+    print '%-10s %10s %10s' % ('bytes', 'chi2', 'refined')
+    for size in [300, 600, 1500]:
+        plain = refined = 0
+        for _ in range(trials):
+            key = random_key(random.randint(4, 14))
+            ct = encrypt(english(size), key)
+            plain += vigenere_crack(ct)[0][0] == key
+            refined += vigenere_crack(ct, refine=model)[0][0] == key
+        print '%-10d %9d%% %9d%%' % (size, plain * 100 / trials, refined * 100 / trials)
+
+def multiples(trials=40):
+    """Cracks returning a multiple of the key length (the key repeated, maybe
+    with a column off) instead of the key, which longer keys used to win by
+    over-fitting their columns.
+    """
+    print '%-10s %10s %10s %10s' % ('method', 'texts', 'recovered', 'multiple')
+    for method in ['friedman', 'kasiski']:
+        recovered = multiple = 0
+        for _ in range(trials):
+            key = random_key(random.randint(3, 9))
+            ct = encrypt(english(random.randint(400, 3000)), key)
+            found = vigenere_crack(ct, method=method)[0][0]
+            recovered += found == key
+            multiple += len(found) > len(key) and len(found) % len(key) == 0
+        print '%-10s %10d %9d%% %9d%%' % (method, trials, recovered * 100 / trials, multiple * 100 / trials)
+
+if __name__ == '__main__':
+    speed()
+    print
+    recovery()
+    print
+    multiples()
@@ -0,0 +1,83 @@
+"""Speed of the xor primitives in cryptools.commons against the original
+per character sxor, with and without NumPy, across input sizes. The
+original is skipped above BASELINE_LIMIT bytes.
+
+Run from the root of the repo: python bench/xor.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cryptools import commons
+from cryptools.commons import nxor, sxor, xor_repeat
+
+BASELINE_LIMIT = 1 << 20
+
+def _baseline_sxor(x, y):
+    return ''.join(chr(ord(xi) ^ ord(yi)) for xi, yi in zip(x, y))
+
+def baseline_sxor(*xs):
+    return ''.join(reduce(_baseline_sxor, tup) for tup in zip(*xs))
+
+def timed(f, *args):
+    repeat = 0
+    start = time.time()
+    while True:
+        f(*args)
+        repeat += 1
+        elapsed = time.time() - start
+        if elapsed >= 0.2:
+            return elapsed / repeat
+
+def baseline_repeat(data, key):
+    return baseline_sxor(data, key * (len(data) / len(key) + 1))
+
+def row(name, size, f, baseline, *args):
+    cols = []
+    expected = None
+    if size <= BASELINE_LIMIT:
+        expected = baseline(*args)
+        cols.append('%10.2fms' % (timed(baseline, *args) * 1e3))
+    else:
+        cols.append('%12s' % '-')
+    np = commons.np
+    for use_np in (False, True):
+        if use_np and np is None:
+            cols.append('%12s' % '-')
+            continue
+        commons.np = np if use_np else None
+        try:
+            assert expected is None or f(*args) == expected
+            cols.append('%10.2fms' % (timed(f, *args) * 1e3))
+        finally:
+            commons.np = np
+    print '%-12s %10d %s' % (name, size, ' '.join(cols))
+
+def compatibility():
+    """sxor against the original on the inputs it took: str, unicode, lists
+    of 1 char strings and mixes of them, with and without NumPy.
+    """
+    cases = [('abc', 'xyz'), (u'abc', u'xyz'), (u'ab', 'cd'), (list('abc'), list('xyz')),
+             (['a', 'b'], 'xyz', u'pq'), (u'\xe9a', 'bb'), ('', 'a')]
+    np = commons.np
+    try:
+        for commons.np in [np, None]:
+            for args in cases:
+                assert sxor(*args) == baseline_sxor(*args), args
+    finally:
+        commons.np = np
+    print 'sxor matches the original on str, unicode and list inputs'
+
+def main():
+    print '%-12s %10s %12s %12s %12s' % ('function', 'bytes', 'original', 'python', 'numpy')
+    for size in [16, 1 << 10, 1 << 16, 1 << 20, 1 << 24]:
+        a, b, c = os.urandom(size), os.urandom(size), os.urandom(size)
+        row('xor 2-way', size, nxor, baseline_sxor, a, b)
+        row('xor 3-way', size, nxor, baseline_sxor, a, b, c)
+        row('repeat key', size, xor_repeat, baseline_repeat, a, 'YELLOW SUBMARINE')
+
+if __name__ == '__main__':
+    compatibility()
+    main()
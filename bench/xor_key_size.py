@@ -0,0 +1,97 @@
+"""Speed and accuracy of the repeating key xor key size estimators.
+
+`baseline` is the original per chunk pair estimator, kept here for reference.
+Accuracy is the share of random keys whose size is ranked first, or is
+within the top 5 guesses, over english-like text.
+
+Run from the root of the repo: python bench/xor_key_size.py
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import cryptools.analysis
+from cryptools.analysis import _xor_guess_key_size, _xor_guess_key_size_coincidence
+from cryptools.commons import chunked, sxor
+
+WORDS = ('the of and to in is was that for it with as his on be at by had are '
+         'but from or have an they which one you were her all she there would').split()
+
+def english(size):
+    words = []
+    length = 0
+    while length < size:
+        words.append(random.choice(WORDS))
+        length += len(words[-1]) + 1
+    return ' '.join(words)[:size]
+
+def baseline(ct, top_results=5, max_key_size=64):
+    distances = []
+    for ksize in range(2, max_key_size+1):
+        chunks = chunked(ct, ksize)
+        hammings = [sum(bin(xi^yi).count('1') for xi, yi in zip(bytearray(chunks[i]), bytearray(chunks[i+1])))
+                    / float(ksize) for i in range(len(chunks)-1)]
+        distances.append((sum(hammings) / len(hammings), ksize))
+    return [tup[1] for tup in sorted(distances)][:top_results]
+
+ESTIMATORS = [
+    ('baseline', baseline),
+    ('hamming', _xor_guess_key_size),
+    ('hamming, stride 8', lambda ct: _xor_guess_key_size(ct, stride=8)),
+    ('coincidence', _xor_guess_key_size_coincidence),
+]
+
+def encrypt(pt, key):
+    return sxor(pt, key * (len(pt) / len(key) + 1))
+
+def speed(size):
+    ct = encrypt(english(size), os.urandom(29))
+    for name, estimator in ESTIMATORS:
+        start = time.time()
+        estimator(ct)
+        print '%-20s %10d %9.3fs' % (name, size, time.time() - start)
+
+def accuracy(size, trials=100):
+    first = dict((name, 0) for name, _ in ESTIMATORS)
+    top = dict(first)
+    for _ in range(trials):
+        key = os.urandom(random.randint(2, 40))
+        guesses = dict((name, estimator(encrypt(english(size), key)))
+                       for name, estimator in ESTIMATORS)
+        for name, guess in guesses.items():
+            first[name] += guess[0] == len(key)
+            top[name] += len(key) in guess
+    for name, _ in ESTIMATORS:
+        print '%-20s %10d %9d%% %9d%%' % (name, size, first[name] * 100 / trials, top[name] * 100 / trials)
+
+def long_range(size, max_key_size=1 << 14):
+    """The coincidence estimator over many more shifts than distinct bytes,
+    comparing the text with itself once per shift and with FFTs.
+    """
+    ct = encrypt(english(size), os.urandom(3))
+    per_value = cryptools.analysis._FFT_SHIFTS_PER_VALUE
+    for name, value in [('per shift', float('inf')), ('fft', per_value)]:
+        cryptools.analysis._FFT_SHIFTS_PER_VALUE = value
+        start = time.time()
+        _xor_guess_key_size_coincidence(ct, max_key_size=max_key_size)
+        print '%-20s %10d %10d %9.3fs' % (name, size, max_key_size, time.time() - start)
+    cryptools.analysis._FFT_SHIFTS_PER_VALUE = per_value
+
+def main():
+    print '%-20s %10s %10s' % ('estimator', 'bytes', 'time')
+    for size in [1 << 12, 1 << 16]:
+        speed(size)
+    print
+    print '%-20s %10s %10s %10s' % ('estimator', 'bytes', 'top 1', 'top 5')
+    for size in [512, 4096]:
+        accuracy(size)
+    print
+    print '%-20s %10s %10s %10s' % ('coincidence', 'bytes', 'shifts', 'time')
+    for size in [1 << 15, 1 << 18]:
+        long_range(size)
+
+if __name__ == '__main__':
+    main()
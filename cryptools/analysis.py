@@ -1,8 +1,21 @@
 # -*- coding: utf-8 -*-
+import re
+import math
 import string
+import struct
+import operator
+import itertools
+import heapq
+import mmap
+import multiprocessing
 
 from collections import defaultdict
-from commons import hamming_bin, chunked, sxor
+from commons import hamming_bin, xor_repeat, as_buffer, iter_windows, iter_xor_repeat
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 ASCII_PRINTABLE_FREQS = {
     '\n': 0.02908045733331944, '!': 0.0007948248708319754, ' ': 0.20026065368955764, '#': 8.983102066365002e-08, 
@@ -25,143 +38,829 @@ ASCII_PRINTABLE_FREQS = {
     '~': 2.6949306199095004e-07, '$': 1e-10, '\r': 1e-10, '\t': 1e-10, '\x0b': 1e-10, '\x0c': 1e-10
 }
 
+class Chi2Scorer(object):
+    """Precompiled χ² test for an expected character distribution.
+
+    `freqs` maps characters to their expected frequency; strings containing
+    any other character score infinity. With `fold_case`, lowercase letters
+    are counted as their uppercase counterparts, which is how
+    `ASCII_PRINTABLE_FREQS` is laid out. Lower scores are better.
+    Scorers are called with the string to score, like `chi2_printable`.
+    """
+    def __init__(self, freqs=ASCII_PRINTABLE_FREQS, fold_case=True):
+        self.freqs = freqs
+        self.fold_case = fold_case
+        # (expected character, characters counted as it, expected frequency)
+        self._members = []
+        for c in freqs:
+            counted = c
+            if fold_case and c.lower() != c and c.lower() not in freqs:
+                counted += c.lower()
+            self._members.append((c, counted, freqs[c]))
+        allowed = ''.join(m[1] for m in self._members)
+        self._allowed = allowed
+        self._allowed_set = set(allowed)
+        self._disallowed = [i for i in range(256) if chr(i) not in allowed]
+        self._np = None
+
+    @classmethod
+    def from_corpus(cls, corpus, alphabet=string.printable, fold_case=True, floor=1e-10):
+        """Builds a scorer from the character frequencies of a sample text.
+
+        Characters of `alphabet` missing from the corpus get frequency `floor`.
+        """
+        if fold_case:
+            corpus = corpus.upper()
+            alphabet = ''.join(sorted(set(alphabet.upper())))
+        counts = defaultdict(int)
+        for c in corpus:
+            counts[c] += 1
+        freqs = dict((c, counts[c] / float(len(corpus)) or floor) for c in alphabet)
+        return cls(freqs, fold_case)
+
+    def __call__(self, s):
+        if isinstance(s, unicode):
+            # unicode.translate takes no deletechars
+            if not self._allowed_set.issuperset(s):
+                return float('inf')
+        elif s.translate(None, self._allowed):
+            return float('inf')
+        n = len(s)
+        counts = dict((c, s.count(c)) for c in set(s))
+        get = counts.get
+        return sum([ (sum(get(m, 0) for m in counted)-(n*e))**2 / (n*e)
+                     for c, counted, e in self._members ])
+
+    def score_histogram(self, hist, n):
+        """Score a string of length `n` from its 256 slot byte histogram."""
+        if any(hist[i] for i in self._disallowed):
+            return float('inf')
+        return sum([ (sum(int(hist[ord(m)]) for m in counted)-(n*e))**2 / (n*e)
+                     for c, counted, e in self._members ])
+
+    def score_histograms(self, hists, n):
+        """Score several strings of length `n` at once, from a NumPy array
+        with one 256 slot byte histogram per row.
+        """
+        if self._np is None:
+            # fold[p, j] is 1 if byte p counts as expected character j
+            fold = np.zeros((256, len(self._members)))
+            for j, (c, counted, e) in enumerate(self._members):
+                for m in counted:
+                    fold[ord(m), j] = 1
+            freqs = np.array([e for c, counted, e in self._members])
+            self._np = (fold, freqs)
+        fold, freqs = self._np
+        expected = n * freqs
+        scores = ((hists.dot(fold) - expected)**2 / expected).sum(axis=1)
+        scores[hists[:, self._disallowed].any(axis=1)] = float('inf')
+        return scores
+
+class NgramScorer(object):
+    """Scores strings by their negative log-likelihood under an n-gram model.
+
+    `logprobs` maps n-grams to their log probability; unseen n-grams get
+    `floor`. Lower scores are better, so it can replace a `Chi2Scorer`.
+    """
+    def __init__(self, logprobs, n, floor=None, fold_case=True):
+        self.logprobs = logprobs
+        self.n = n
+        self.floor = floor if floor is not None else min(logprobs.values()) - math.log(100)
+        self.fold_case = fold_case
+
+    @classmethod
+    def from_corpus(cls, corpus, n=2, fold_case=True):
+        """Builds an n-gram model from the n-grams of a sample text."""
+        if fold_case:
+            corpus = corpus.upper()
+        counts = count_ngrams(corpus, n)
+        total = float(sum(counts.values()))
+        logprobs = dict((g, math.log(c / total)) for g, c in counts.items())
+        return cls(logprobs, n, fold_case=fold_case)
+
+    def __call__(self, s):
+        if self.fold_case:
+            s = s.upper()
+        get = self.logprobs.get
+        return -sum(get(s[i:i+self.n], self.floor) for i in xrange(len(s)-self.n+1))
+
+CHI2_PRINTABLE = Chi2Scorer(ASCII_PRINTABLE_FREQS)
+
 def chi2_printable(s):
     """
     Run the χ² test on given string for expected distribution 
     of printable characters. Returns the calculated difference.
+
+    `s` can also be a buffer (bytearray, memoryview, mmap) or a file,
+    which is scored from a byte histogram built one window at a time.
     """
-    obs = defaultdict(int)
-    for letter in s:
-        if letter not in string.printable:
-            return float('inf')
-        elif letter in string.ascii_lowercase:
-            obs[letter.upper()] += 1
-        else:
-            obs[letter] += 1
-    exp = ASCII_PRINTABLE_FREQS
-    return sum([ (obs[c]-(len(s)*exp[c]))**2 / (len(s)*exp[c]) for c in exp ])
+    if isinstance(s, basestring):
+        return CHI2_PRINTABLE(s)
+    hist, n = _byte_histogram(s)
+    return CHI2_PRINTABLE.score_histogram(hist, n)
+
+# window size of the functions that read buffers and files piecewise
+STREAM_CHUNK_SIZE = 1 << 20
+# bytes of a buffer used to guess the key size of repeating key xor
+XOR_SAMPLE_SIZE = 1 << 20
+
+_NP_TABLES = {}
+
+def _np_xor_table():
+    if 'xored' not in _NP_TABLES:
+        idx = np.arange(256)
+        # xored[k, p] == k ^ p
+        _NP_TABLES['xored'] = idx[:, None] ^ idx[None, :]
+    return _NP_TABLES['xored']
+
+def _rot_table(alphabet, n, text):
+    """Translation table for `text` rotating the characters of `alphabet` by n positions."""
+    mapping = {}
+    for i, c in enumerate(alphabet):
+        mapping.setdefault(c, alphabet[(i + n) % len(alphabet)])
+    if isinstance(text, unicode):
+        return dict((ord(c), unicode(r)) for c, r in mapping.items())
+    return ''.join(mapping.get(chr(i), chr(i)) for i in range(256))
+
+def _as_alphabet_text(text, alphabet):
+    """`text` as unicode if `alphabet` is, so rotated characters fit in it."""
+    if isinstance(alphabet, unicode) and not isinstance(text, unicode):
+        return unicode(text)
+    return text
 
 def rotN(text, n, alphabet=string.ascii_lowercase):
     """Rotate text by N positions, based on given alphabet.
     
     If a character is not in the alphabet it is kept as is.
     """
-    rotated = ''
-    for c in text:
-        try:
-            rotated += alphabet[(alphabet.index(c) + n) % len(alphabet)]
-        except ValueError:
-            rotated += c
-    return rotated
+    text = _as_alphabet_text(text, alphabet)
+    return text.translate(_rot_table(alphabet, n, text))
+
+def _np_popcount():
+    if 'popcount' not in _NP_TABLES:
+        _NP_TABLES['popcount'] = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return _NP_TABLES['popcount']
 
-def _xor_guess_key_size(ct, top_results=5, max_key_size=64):
+def _chunk_hamming(ct, ksize, stride=1):
+    """Total binary hamming distance between adjacent `ksize` chunks of ct,
+    sampling every `stride`-th pair. Returns the distance and number of pairs.
+    """
+    pairs = (len(ct) - 1) / ksize
+    starts = range(0, pairs*ksize, stride*ksize)
+    if np is not None:
+        data = np.frombuffer(ct, dtype=np.uint8)
+        if stride == 1:
+            xored = data[:-ksize] ^ data[ksize:]
+        else:
+            idx = (np.array(starts)[:, None] + np.arange(ksize)).ravel()
+            idx = idx[idx < len(data) - ksize]
+            xored = data[idx] ^ data[idx+ksize]
+        return int(_np_popcount()[xored].sum(dtype=np.int64)), len(starts)
+    if stride == 1:
+        # every chunk pair at once: the string against itself shifted by ksize
+        return hamming_bin(ct[:-ksize], ct[ksize:]), pairs
+    return sum(hamming_bin(ct[i:i+ksize], ct[i+ksize:i+2*ksize]) for i in starts), len(starts)
+
+def _xor_guess_key_size(ct, top_results=5, max_key_size=64, stride=1):
     """Returns a list of the most likely key sizes for a ciphertext 
     xored with a repeating key.
+
+    Compares every pair of adjacent chunks, or every `stride`-th pair.
     """
     distances = []
     for ksize in range(2, max_key_size+1):
-        chunks = chunked(ct, ksize)
-        hammings = [hamming_bin(chunks[i], chunks[i+1])/float(ksize) 
-                    for i in range(len(chunks)-1)]
-        distances.append((sum(hammings) / len(hammings), ksize))
+        total, pairs = _chunk_hamming(ct, ksize, stride)
+        if not pairs:
+            break
+        distances.append((total / float(ksize) / pairs, ksize))
     return [tup[1] for tup in sorted(distances)][:top_results]
 
-def _xor_key_candidate(ct, keysize):
-    blocks = []
+# Comparing the ciphertext with itself shifted costs about as much per shift
+# as an FFT autocorrelation costs per distinct byte value, times this much.
+_FFT_SHIFTS_PER_VALUE = 64
+
+def _np_coincidences_fft(data, values, max_shift):
+    """Equal byte pairs of `data` at every shift up to `max_shift`, as the
+    sum over byte `values` of the autocorrelation of where they occur.
+    """
+    size = 1 << (len(data) + max_shift - 1).bit_length()
+    total = np.zeros(max_shift + 1)
+    for v in values:
+        f = np.fft.rfft((data == v).astype(np.float64), size)
+        total += np.fft.irfft(f.real**2 + f.imag**2, size)[:max_shift + 1]
+    return np.rint(total).astype(np.int64)
+
+def _xor_guess_key_size_coincidence(ct, top_results=5, max_key_size=64):
+    """Returns a list of the most likely key sizes for a ciphertext 
+    xored with a repeating key, based on autocorrelation.
+
+    Bytes xored with the same key byte are equal as often as their plaintext
+    bytes, which is much more often than random bytes, so shifting the
+    ciphertext by the key size (or a multiple) gives the most coincidences.
+
+    The ciphertext is compared with itself once per shift. With NumPy and
+    many more shifts than distinct bytes, all shifts are counted at once
+    from FFTs instead, one per distinct byte.
+    """
+    shifts = range(2, min(max_key_size, len(ct) - 1) + 1)
+    if np is None:
+        same = [sum(itertools.imap(operator.eq, ct[:-k], ct[k:])) for k in shifts]
+    else:
+        data = np.frombuffer(ct, dtype=np.uint8)
+        values = []
+        if shifts and max_key_size > _FFT_SHIFTS_PER_VALUE:
+            values = np.flatnonzero(np.bincount(data, minlength=256))
+        if 0 < len(values) * _FFT_SHIFTS_PER_VALUE < max_key_size:
+            counts = _np_coincidences_fft(data, values, shifts[-1])
+            same = [int(counts[k]) for k in shifts]
+        else:
+            same = [int((data[:-k] == data[k:]).sum()) for k in shifts]
+    rates = [(-count / float(len(ct) - k), k) for count, k in zip(same, shifts)]
+    return [tup[1] for tup in sorted(rates)][:top_results]
+
+def _xor_column_key_py(group, scorer=CHI2_PRINTABLE):
+    """Most likely single byte xor key for a column of the ciphertext,
+    or None if no key produces a plausible column.
+    """
+    ppts = [(xor_repeat(group, chr(i)), i) for i in range(256)]
+    # list of -> ((singly_xored_text, xor_char), χ²)
+    results = map(lambda x: (x, scorer(x[0])), ppts)
+    results = sorted(results, key=lambda x: x[1])
+    if results[0][1] == float('inf'):
+        return None
+    return results[0][0][1]
+
+def _xor_column_key_np(column, scorer=CHI2_PRINTABLE):
+    """NumPy version of `_xor_column_key_py`. The column is reduced to a
+    byte histogram once; the plaintext histograms of all 256 keys are
+    permutations of it, so all of them are scored in a single pass.
+    """
+    if not isinstance(column, np.ndarray):
+        column = np.frombuffer(column, dtype=np.uint8)
+    return _xor_hist_key(np.bincount(column, minlength=256), len(column), scorer)
+
+def _xor_hist_key(hist, n, scorer=CHI2_PRINTABLE):
+    """`_xor_column_key` for a column of `n` bytes given as its byte histogram."""
+    if np is not None:
+        # hist[xored][k, p] is the count of plaintext byte p when xored with key k
+        scores = scorer.score_histograms(np.asarray(hist)[_np_xor_table()], n)
+        best = int(scores.argmin())
+        if scores[best] == float('inf'):
+            return None
+        return best
+    score, best = min((scorer.score_histogram([hist[p ^ k] for p in xrange(256)], n), k)
+                      for k in xrange(256))
+    if score == float('inf'):
+        return None
+    return best
+
+def _xor_column_key(group, scorer=CHI2_PRINTABLE):
+    if np is not None and hasattr(scorer, 'score_histograms'):
+        return _xor_column_key_np(group, scorer)
+    return _xor_column_key_py(group, scorer)
+
+def _xor_key_candidate_py(ct, keysize, scorer=CHI2_PRINTABLE):
+    key = []
     for i in range(keysize):
-        group = ct[i::keysize]
-        ppts = [(sxor(group, chr(i)*len(group)), i) for i in range(256)]
-        # list of -> ((singly_xored_text, xor_char), χ²)
-        results = map(lambda x: (x, chi2_printable(x[0])), ppts)
-        results = sorted(results, key=lambda x: x[1])
-        if results[0][1] == float('inf'):
+        k = _xor_column_key_py(ct[i::keysize], scorer)
+        if k is None:
             # key size doesn't produce anything printable
             return None
-        blocks.append(results[0][0])  
-    ppt = ''.join([blocks[i%keysize][0][i/len(blocks)] 
-                  for i in range(len(ct))])
-    pkey = ''.join(map(chr, [b[1] for b in blocks]))
-    return (chi2_printable(ppt), pkey, ppt)
+        key.append(k)
+    return _xor_scored_candidate(ct, ''.join(map(chr, key)), scorer)
 
-def _rot_key_candidate(ct, keysize, alphabet=string.ascii_lowercase):
-    """Apply the same principles as repeating key xor to find possible candidate
-    for a Vigenere key. It will almost surely return wrong prediction but it may
-    be close enough that you can guess the key. Experimental.
+def _xor_key_candidate_np(ct, keysize, scorer=CHI2_PRINTABLE):
+    """NumPy version of `_xor_key_candidate`. Columns are strided views
+    of the ciphertext rather than copies.
     """
-    if keysize < 0:
-        raise Exception("Invalid keysize; must be positive")
-    blocks = []
+    data = np.frombuffer(ct, dtype=np.uint8)
+    key = []
     for i in range(keysize):
-        group = ct[i::keysize]
-        ppts = [(rotN(group, i+1, alphabet), alphabet[ (len(alphabet)-i-1)%len(alphabet) ]) 
-                for i in range(len(alphabet))]
-        # list of -> ((rotated text, key char), χ²)
-        results = map(lambda x: (x, chi2_printable(x[0])), ppts)
-        results = sorted(results, key=lambda x: x[1])
-        if results[0][1] == float('inf'):
+        k = _xor_column_key_np(data[i::keysize], scorer)
+        if k is None:
             # key size doesn't produce anything printable
             return None
-        blocks.append(results[0][0])  
-    ppt = ''.join([blocks[i%keysize][0][i/len(blocks)] 
-                  for i in range(len(ct))])
-    pkey = ''.join([b[1] for b in blocks])
-    return (chi2_printable(ppt), pkey, ppt)
-
-# TODO: Filter out duplicate keys
-def repeating_xor_decrypt(ct, top_results=5, keysize=None, key=None):
+        key.append(k)
+    return _xor_scored_candidate(ct, ''.join(map(chr, key)), scorer)
+
+def _xor_key_candidate(ct, keysize, scorer=CHI2_PRINTABLE):
+    if np is not None and hasattr(scorer, 'score_histograms'):
+        return _xor_key_candidate_np(ct, keysize, scorer)
+    return _xor_key_candidate_py(ct, keysize, scorer)
+
+def _xor_scored_candidate(ct, key, scorer=CHI2_PRINTABLE):
+    """Decrypts ct with the repeating `key`; returns (score, key, plaintext)."""
+    ppt = xor_repeat(ct, key)
+    if np is not None and hasattr(scorer, 'score_histogram'):
+        hist = np.bincount(np.frombuffer(ppt, dtype=np.uint8), minlength=256)
+        return (scorer.score_histogram(hist, len(ct)), key, ppt)
+    return (scorer(ppt), key, ppt)
+
+def _xor_column_job(args):
+    return _xor_column_key(*args)
+
+def _xor_key_candidates_parallel(ct, ksizes, scorer, workers):
+    """Solves the columns of all key sizes in a process pool."""
+    jobs = [(ct[i::ksize], scorer) for ksize in ksizes for i in range(ksize)]
+    pool = multiprocessing.Pool(workers)
+    try:
+        column_keys = pool.map(_xor_column_job, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    candidates = []
+    for ksize in ksizes:
+        key, column_keys = column_keys[:ksize], column_keys[ksize:]
+        if None not in key:
+            candidates.append(_xor_scored_candidate(ct, ''.join(map(chr, key)), scorer))
+    return candidates
+
+def _xor_column_histograms(buf, ksizes, chunk_size=STREAM_CHUNK_SIZE):
+    """Byte histograms of the key columns of `buf` for every key size, as
+    {ksize: [histogram per column]}. The buffer is read once, one window
+    at a time, and columns are strided views of the window.
+    """
+    hists = {}
+    for ksize in ksizes:
+        if np is not None:
+            hists[ksize] = np.zeros((ksize, 256), dtype=np.int64)
+        else:
+            hists[ksize] = [[0]*256 for _ in range(ksize)]
+    pos = 0
+    for w in iter_windows(buf, chunk_size):
+        data = np.frombuffer(w, dtype=np.uint8) if np is not None else w
+        for ksize in ksizes:
+            for j in range(min(ksize, len(w))):
+                hist = hists[ksize][(pos + j) % ksize]
+                if np is not None:
+                    hist += np.bincount(data[j::ksize], minlength=256)
+                else:
+                    column = w[j::ksize]
+                    for c in set(column):
+                        hist[ord(c)] += column.count(c)
+        pos += len(w)
+    return hists
+
+def _xor_hist_key_job(args):
+    return _xor_hist_key(*args)
+
+def _xor_key_candidates_buffer(buf, ksizes, scorer, workers=None):
+    """`_xor_key_candidate` for every key size over a buffer, from the column
+    histograms alone. Plaintexts are returned as `iter_xor_repeat` iterators.
+    With `workers` set the column histograms are scored in a process pool.
+    """
+    hists = _xor_column_histograms(buf, ksizes)
+    ksizes = [ksize for ksize in ksizes if ksize <= len(buf)]
+    jobs = [(hist, int(sum(hist)), scorer) for ksize in ksizes for hist in hists[ksize]]
+    if workers:
+        pool = multiprocessing.Pool(workers)
+        try:
+            column_keys = pool.map(_xor_hist_key_job, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        column_keys = map(_xor_hist_key_job, jobs)
+    candidates = []
+    for ksize in ksizes:
+        key, column_keys = column_keys[:ksize], column_keys[ksize:]
+        if None in key:
+            continue
+        # plaintext histogram: every column's histogram permuted by its key byte
+        if np is not None:
+            xored = _np_xor_table()
+            total = sum(hist[xored[k]] for hist, k in zip(hists[ksize], key))
+        else:
+            total = [sum(hist[p ^ k] for hist, k in zip(hists[ksize], key)) for p in xrange(256)]
+        key = ''.join(map(chr, key))
+        candidates.append((scorer.score_histogram(total, len(buf)), key, iter_xor_repeat(buf, key)))
+    return candidates
+
+def _key_period(key):
+    """Shortest p for which `key` is key[:p] repeated."""
+    for p in range(1, len(key)):
+        if len(key) % p == 0 and key[:p] * (len(key) / p) == key:
+            return p
+    return len(key)
+
+def repeating_xor_decrypt(ct, top_results=5, keysize=None, key=None, keysize_method='hamming',
+                          scorer=CHI2_PRINTABLE, workers=None):
     """Tries to decrypt english text that has been XORed with a repeating key. 
 
     Accepts the binary ciphertext and, optionally, the keysize if it's known. 
-    If no keysize given tries to guess based on hamming binary distance.
+    If no keysize given tries to guess based on hamming binary distance,
+    or on autocorrelation if `keysize_method` is 'coincidence'.
+
+    Candidates are ranked by `scorer`, a function returning lower scores for
+    more likely plaintexts, e.g. a `Chi2Scorer` or `NgramScorer`.
+
+    If `workers` is set, the key bytes of all guessed key sizes are solved
+    in a process pool of that size, for buffer input too. `scorer` must
+    then be picklable.
+
+    `ct` can also be a buffer (bytearray, memoryview, mmap) or a file, e.g.
+    from `commons.map_file`, which is never read in memory as a whole: key sizes
+    are guessed from its first XOR_SAMPLE_SIZE bytes, key bytes from column
+    histograms built one STREAM_CHUNK_SIZE window at a time, and plaintexts
+    are returned as iterators of decrypted windows. Memory use stays around
+    a window plus 2KB per key byte, whatever the size of the input. Scorers
+    without `score_histogram` solve the key on the sample instead.
     
     Returns a list of (key, plaintext) tuples, up to specified number of top results,
     sorted most to least likely. Can return less if not enough candidates.
+    Keys that repeat a shorter key are only returned once, as the shorter key.
     """
+    buf = None
+    if not isinstance(ct, basestring):
+        buf = as_buffer(ct)
+        ct = next(iter_windows(buf, XOR_SAMPLE_SIZE), '')
     if key:
-        return [(key, sxor(ct, key*(len(ct)/len(key))))]
+        if buf is not None:
+            return [(key, iter_xor_repeat(buf, key))]
+        return [(key, xor_repeat(ct, key))]
     if keysize:
         if type(keysize) not in [int,float] or keysize < 1:
             raise Exception("Keysize invalid")
         ksizes = [keysize]
-    else:
+    elif keysize_method == 'coincidence':
+        ksizes = _xor_guess_key_size_coincidence(ct)
+    elif keysize_method == 'hamming':
         ksizes = _xor_guess_key_size(ct)
-    candidates = []
-    for ksize in ksizes:
-        candidate = _xor_key_candidate(ct, ksize)
-        if candidate:
-            candidates.append(candidate)
-    return [(c[1], c[2]) for c in sorted(candidates)][:top_results]
+    else:
+        raise Exception("Unknown keysize method")
+    if buf is not None and hasattr(scorer, 'score_histogram'):
+        candidates = _xor_key_candidates_buffer(buf, ksizes, scorer, workers)
+    elif workers:
+        candidates = _xor_key_candidates_parallel(ct, ksizes, scorer, workers)
+    else:
+        candidates = []
+        for ksize in ksizes:
+            candidate = _xor_key_candidate(ct, ksize, scorer)
+            if candidate:
+                candidates.append(candidate)
+    if buf is not None:
+        candidates = [(c[0], c[1], iter_xor_repeat(buf, c[1])) for c in candidates]
+    results = []
+    for c in sorted(candidates):
+        pkey = c[1][:_key_period(c[1])]
+        if pkey not in [r[0] for r in results]:
+            results.append((pkey, c[2]))
+    return results[:top_results]
+
+def _alphabet_split(text, alphabet):
+    """Splits text into a string of its alphabet characters and a list of
+    alternating alphabet / non-alphabet runs, to put it back together.
+    """
+    if all(c in alphabet for c in set(text)):
+        return text, [text]
+    runs = re.split('([^%s]+)' % ''.join(re.escape(c) for c in alphabet), text)
+    return ''.join(runs[::2]), runs
+
+def _alphabet_join(letters, runs):
+    """Inverse of `_alphabet_split`, with `letters` replacing the alphabet characters."""
+    out = []
+    i = 0
+    for j, run in enumerate(runs):
+        if j % 2:
+            out.append(run)
+        else:
+            out.append(letters[i:i+len(run)])
+            i += len(run)
+    return ''.join(out)
+
+def _vigenere_shift(letters, key, alphabet, sign):
+    letters = _as_alphabet_text(letters, alphabet)
+    columns = []
+    for i, k in enumerate(key):
+        rot = (sign * alphabet.index(k)) % len(alphabet)
+        columns.append(letters[i::len(key)].translate(_rot_table(alphabet, rot, letters)))
+    shifted = list(letters)
+    for i, column in enumerate(columns):
+        shifted[i::len(key)] = column
+    return letters[:0].join(shifted)
 
 def vigenere_decrypt(ct, key, alphabet=string.ascii_lowercase):
     """Decrypts Vigenere ciphertext with given key. Skips over characters
     not in the alphabet.
     """
+    if not key:
+        raise Exception("Empty key")
     if not all([c in alphabet for c in key]):
         raise Exception("Key must only contain alphabet characters")
-    ki = 0
-    pt = ''
-    for c in ct:
-        if c not in alphabet:
-            pt += c
+    letters, runs = _alphabet_split(ct, alphabet)
+    return _alphabet_join(_vigenere_shift(letters, key, alphabet, -1), runs)
+
+def _letter_freqs(alphabet, floor=1e-10):
+    """Expected frequencies of the alphabet characters, from `ASCII_PRINTABLE_FREQS`."""
+    freqs = [ASCII_PRINTABLE_FREQS.get(c.upper(), floor) for c in alphabet]
+    return [f / sum(freqs) for f in freqs]
+
+def _index_of_coincidence(letters, alphabet):
+    n = len(letters)
+    if n < 2:
+        return 0.0
+    return sum(k*(k-1) for k in (letters.count(c) for c in alphabet)) / float(n*(n-1))
+
+def _vigenere_key_lengths(letters, alphabet=string.ascii_lowercase, top_results=5, max_key_length=32):
+    """Returns a list of the most likely Vigenere key lengths (Friedman test).
+
+    For the right length every column is a plain rot of the plaintext, so its
+    index of coincidence matches the language's rather than random text's.
+    Multiples of the key length score as well, so the lengths that reach
+    halfway between the two come first, shortest first.
+    """
+    language = sum(f*f for f in _letter_freqs(alphabet))
+    threshold = (language + 1.0/len(alphabet)) / 2
+    scores = []
+    for length in range(1, min(max_key_length, len(letters)/2) + 1):
+        ioc = sum(_index_of_coincidence(letters[i::length], alphabet)
+                  for i in range(length)) / length
+        scores.append(((0, length) if ioc >= threshold else (1, -ioc), length))
+    return [tup[1] for tup in sorted(scores)][:top_results]
+
+def _kasiski_key_lengths(letters, top_results=5, max_key_length=32, n=3):
+    """Returns a list of the most likely Vigenere key lengths (Kasiski examination),
+    ranked by how many distances between repeated ngrams they divide.
+    """
+    positions = defaultdict(list)
+    for i in xrange(len(letters)-n+1):
+        positions[letters[i:i+n]].append(i)
+    votes = defaultdict(int)
+    for ps in positions.itervalues():
+        for a, b in zip(ps, ps[1:]):
+            for length in range(2, max_key_length+1):
+                if (b - a) % length == 0:
+                    votes[length] += 1
+    # longer lengths divide fewer distances by chance; favour them on ties
+    return [l for l, v in sorted(votes.items(), key=lambda x: (-x[1]*x[0], x[0]))][:top_results]
+
+def _vigenere_column_shifts(column, alphabet, freqs):
+    """Key indices for a single column, most likely first, by a χ² test
+    over the alphabet characters.
+    """
+    counts = [column.count(c) for c in alphabet]
+    n = len(column) or 1
+    size = len(alphabet)
+    scores = []
+    for shift in range(size):
+        scores.append((sum((counts[(j+shift) % size] - n*e)**2 / (n*e)
+                           for j, e in enumerate(freqs)), shift))
+    return [tup[1] for tup in sorted(scores)]
+
+def _rot_key_candidate(ct, keysize, alphabet=string.ascii_lowercase, scorer=CHI2_PRINTABLE):
+    """Apply the same principles as repeating key xor to find possible candidate
+    for a Vigenere key. Each key character is solved by a χ² test on the
+    alphabet characters it encrypts.
+    """
+    if keysize < 1:
+        raise Exception("Invalid keysize; must be positive")
+    letters, runs = _alphabet_split(ct, alphabet)
+    freqs = _letter_freqs(alphabet)
+    pkey = ''.join(alphabet[_vigenere_column_shifts(letters[i::keysize], alphabet, freqs)[0]]
+                   for i in range(keysize))
+    ppt = _alphabet_join(_vigenere_shift(letters, pkey, alphabet, -1), runs)
+    return (scorer(ppt), pkey, ppt)
+
+def _vigenere_refine(ct, pkey, alphabet, scorer, alternatives=3):
+    """Hill climb from a candidate key: swap one key character at a time for
+    one of its column's next best characters, for as long as the whole
+    plaintext scores better. Returns (score, key, plaintext).
+    """
+    letters, runs = _alphabet_split(ct, alphabet)
+    freqs = _letter_freqs(alphabet)
+    options = [[alphabet[s] for s in _vigenere_column_shifts(letters[i::len(pkey)], alphabet, freqs)
+                [:alternatives]] for i in range(len(pkey))]
+    ppt = _alphabet_join(_vigenere_shift(letters, pkey, alphabet, -1), runs)
+    best = scorer(ppt)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(pkey)):
+            for c in options[i]:
+                if c == pkey[i]:
+                    continue
+                key = pkey[:i] + c + pkey[i+1:]
+                pt = _alphabet_join(_vigenere_shift(letters, key, alphabet, -1), runs)
+                score = scorer(pt)
+                if score < best:
+                    best, pkey, ppt = score, key, pt
+                    improved = True
+    return (best, pkey, ppt)
+
+# Every key character is fitted to its column, so longer keys fit the
+# text better by chance; scores grow by this much per key character per
+# letter of ciphertext.
+_KEY_LENGTH_PENALTY = 8
+
+def _near_repeat(key, short, mismatches=0.25):
+    """True if `key` is `short` repeated, up to a `mismatches` fraction of
+    its characters.
+    """
+    if len(key) % len(short):
+        return False
+    repeated = short * (len(key) // len(short))
+    return sum(a != b for a, b in zip(key, repeated)) <= len(key) * mismatches
+
+def vigenere_crack(ct, top_results=5, keysize=None, alphabet=string.ascii_lowercase,
+                   scorer=CHI2_PRINTABLE, method='friedman', refine=None, max_key_length=32):
+    """Tries to recover the key of a Vigenere ciphertext. Characters not in the
+    alphabet are skipped, like `vigenere_decrypt` does.
+
+    If no keysize given tries to guess it, using the index of coincidence of
+    the key columns ('friedman' method) or repeated trigram distances ('kasiski').
+    Candidates are ranked by `scorer`, penalized by key length since longer
+    keys fit the text better by chance; keys that repeat a shorter candidate
+    with a few columns off are merged into it. If `refine` is a scorer, each key is then
+    improved one character at a time against the score that scorer gives the
+    whole plaintext. An `NgramScorer` with n >= 2 works best, since it catches
+    columns whose χ² test alone picked the wrong character.
+
+    Returns a list of (key, plaintext) tuples, up to specified number of top results,
+    sorted most to least likely.
+    """
+    letters, _ = _alphabet_split(ct, alphabet)
+    if keysize:
+        ksizes = [keysize]
+    elif method == 'friedman':
+        ksizes = _vigenere_key_lengths(letters, alphabet, max_key_length=max_key_length)
+    elif method == 'kasiski':
+        ksizes = _kasiski_key_lengths(letters, max_key_length=max_key_length)
+    else:
+        raise Exception("Unknown keysize method")
+    candidates = [_rot_key_candidate(ct, ksize, alphabet, scorer) for ksize in ksizes]
+    if refine:
+        candidates = [_vigenere_refine(ct, c[1], alphabet, refine) for c in candidates]
+    # Longer keys over-fit their shorter columns: scores are penalized by
+    # key length, and keys that nearly repeat a shorter candidate (multiples
+    # of the key length with a column off) are merged into it.
+    penalty = _KEY_LENGTH_PENALTY / float(len(letters) or 1)
+    entries = [[c[0] * (1 + penalty * len(c[1])), c[1][:_key_period(c[1])], c[2]] for c in candidates]
+    kept = []
+    for e in sorted(entries, key=lambda e: len(e[1])):
+        shorter = next((k for k in kept if len(k[1]) < len(e[1]) and _near_repeat(e[1], k[1])), None)
+        if shorter is None:
+            kept.append(e)
         else:
-            rot = (len(alphabet) - alphabet.index(key[ki])) % len(alphabet)
-            pt += alphabet[(alphabet.index(c) + rot) % len(alphabet)]
-            ki = (ki + 1) % len(key)
-    return pt
+            shorter[0] = min(shorter[0], e[0])
+    results = []
+    for _, pkey, ppt in sorted(kept):
+        if pkey not in [r[0] for r in results]:
+            results.append((pkey, ppt))
+    return results[:top_results]
 
 def _sort_counter_dict(d, reverse):
     ks = sorted(d, key=lambda x: d[x], reverse=reverse)
     return [(k, d[k]) for k in ks]
 
-def count_ngrams(ct, n):
-    """Counts ngrams in ciphertext and returns a dictionary of ngram -> count."""
+
+def _iter_chunks(source, chunk_size=STREAM_CHUNK_SIZE):
+    """Chunks of a string, a buffer (bytearray, memoryview, mmap),
+    a file-like object or an iterable of strings.
+    """
+    if isinstance(source, basestring):
+        yield source
+    elif isinstance(source, (bytearray, memoryview, mmap.mmap)):
+        for chunk in iter_windows(source, chunk_size):
+            yield chunk
+    elif hasattr(source, 'read'):
+        for chunk in iter(lambda: source.read(chunk_size), ''):
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+def _byte_histogram(source, chunk_size=STREAM_CHUNK_SIZE):
+    """256 slot byte histogram and length of anything `_iter_chunks` reads."""
+    hist = np.zeros(256, dtype=np.int64) if np is not None else [0]*256
+    n = 0
+    for chunk in _iter_chunks(source, chunk_size):
+        n += len(chunk)
+        if not chunk:
+            continue
+        if np is not None:
+            hist += np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256)
+        else:
+            for c in set(chunk):
+                hist[ord(c)] += chunk.count(c)
+    return hist, n
+
+def _add_ngrams(counts, s, n):
+    if np is not None and isinstance(s, str) and n <= 8 and len(s) > 4096:
+        # encode every ngram as an integer and let numpy do the counting
+        m = len(s) - n + 1
+        data = np.frombuffer(s, dtype=np.uint8).astype(np.uint64)
+        codes = np.zeros(m, dtype=np.uint64)
+        for j in range(n):
+            codes = (codes << np.uint64(8)) | data[j:j+m]
+        values, freqs = np.unique(codes, return_counts=True)
+        for value, freq in zip(values.tolist(), freqs.tolist()):
+            counts[struct.pack('>Q', value)[8-n:]] += freq
+    else:
+        for i in xrange(0, len(s)-(n-1)):
+            counts[s[i:i+n]] += 1
+
+def count_ngrams_stream(source, n, chunk_size=STREAM_CHUNK_SIZE):
+    """Counts ngrams in a file-like object or an iterable of string chunks and
+    returns a dictionary of ngram -> count.
+
+    Only one chunk is held in memory at a time; ngrams crossing chunk
+    boundaries are counted once. Results of separate shards can be
+    combined with `merge_counts`.
+    """
     if n < 1:
         raise ValueError("n must be positive")
     ngrams = defaultdict(int)
-    for i in range(0, len(ct)-(n-1)):
-        ngrams[ct[i:i+n]] += 1
+    carry = ''
+    for chunk in _iter_chunks(source, chunk_size):
+        chunk = carry + chunk
+        _add_ngrams(ngrams, chunk, n)
+        # the last n-1 characters start ngrams that end in the next chunk
+        carry = chunk[max(0, len(chunk)-(n-1)):]
     return dict(ngrams)
 
+def count_ngrams(ct, n):
+    """Counts ngrams in ciphertext and returns a dictionary of ngram -> count.
+
+    `ct` can also be a buffer (bytearray, memoryview, mmap) or a file,
+    which is counted one window at a time.
+    """
+    if isinstance(ct, basestring):
+        ct = [ct]
+    return count_ngrams_stream(ct, n)
+
+def merge_counts(*counts):
+    """Sums dictionaries of item -> count, e.g. ngram counts of separate shards."""
+    merged = defaultdict(int)
+    for c in counts:
+        for item, count in c.iteritems():
+            merged[item] += count
+    return dict(merged)
+
+class SpaceSaving(object):
+    """Approximate top-k counter (Space-Saving algorithm) that tracks at most
+    `k` items, no matter how many distinct items are seen.
+
+    Frequent items are always tracked. A count may be overestimated by at
+    most `errors[item]`. Evicting an item takes O(log k).
+    """
+    def __init__(self, k):
+        if k < 1:
+            raise ValueError("k must be positive")
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+        # (count, item) for every tracked item. Counts only grow, so an entry
+        # may be stale low; it's brought up to date when it reaches the top.
+        self._heap = []
+
+    def _pop_min(self):
+        while True:
+            low, item = self._heap[0]
+            if self.counts[item] == low:
+                return heapq.heappop(self._heap)
+            heapq.heapreplace(self._heap, (self.counts[item], item))
+
+    def update(self, item, count=1):
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        if len(self.counts) < self.k:
+            low = 0
+        else:
+            # the new item takes over the least frequent one and its count
+            low, victim = self._pop_min()
+            del self.counts[victim]
+            del self.errors[victim]
+        self.counts[item] = low + count
+        self.errors[item] = low
+        heapq.heappush(self._heap, (low + count, item))
+
+    def merge(self, other):
+        """Adds the counts of another `SpaceSaving`, e.g. from another shard."""
+        for item, count in other.counts.iteritems():
+            self.update(item, count)
+            self.errors[item] += other.errors[item]
+        return self
+
+    def most_common(self, n=None):
+        """Returns a list of (item, count) tuples, most frequent first."""
+        return _sort_counter_dict(self.counts, True)[:n]
+
+def top_ngrams_stream(source, n, k, chunk_size=STREAM_CHUNK_SIZE):
+    """Approximate `k` most frequent ngrams in a file-like object or an iterable
+    of string chunks, using memory for `k` ngrams. Returns a `SpaceSaving`.
+    """
+    if n < 1:
+        raise ValueError("n must be positive")
+    top = SpaceSaving(k)
+    carry = ''
+    for chunk in _iter_chunks(source, chunk_size):
+        chunk = carry + chunk
+        for i in xrange(0, len(chunk)-(n-1)):
+            top.update(chunk[i:i+n])
+        carry = chunk[max(0, len(chunk)-(n-1)):]
+    return top
+
 def sorted_ngrams(ct, n, reverse=True):
     """Returns a list of tuples (ngram, count) sorted by count.
 
@@ -170,22 +869,33 @@ def sorted_ngrams(ct, n, reverse=True):
     ngrams = count_ngrams(ct, n)
     return _sort_counter_dict(ngrams, reverse)
 
+_DOUBLES = re.compile(r'(.)\1', re.DOTALL)
+
+def count_doubles_stream(source, chunk_size=STREAM_CHUNK_SIZE):
+    """Counts doubled letters in a file-like object or an iterable of string
+    chunks and returns a dictionary of letters -> count.
+
+    Same as `count_doubles`, with doubles crossing chunk boundaries counted once.
+    """
+    doubles = defaultdict(int)
+    carry = ''
+    for chunk in _iter_chunks(source, chunk_size):
+        chunk = carry + chunk
+        end = 0
+        # non-overlapping matches, leftmost first, pair letters the same way as a linear scan
+        for match in _DOUBLES.finditer(chunk):
+            doubles[match.group()] += 1
+            end = match.end()
+        # a last letter that wasn't paired may pair with the next chunk
+        carry = chunk[-1:] if end < len(chunk) else chunk[:0]
+    return dict(doubles)
+
 def count_doubles(ct):
     """Counts doubled letters in ciphertext and returns a dictionary of letters -> count.
 
     Each letter can only exist in one double, e.g. 'abccc' will return {'cc': 1}.
     """
-    doubles = defaultdict(int)
-    i = 0
-    while True:
-        if i >= len(ct)-1:
-            break
-        elif ct[i] == ct[i+1]:
-            doubles['%s%s' % (ct[i], ct[i])] += 1
-            i += 2
-        else:
-            i += 1
-    return dict(doubles)
+    return count_doubles_stream([ct])
 
 def sorted_doubles(ct, reverse=True):
     """Returns a list of tuples (doubles, count) sorted by count.
@@ -1,21 +1,17 @@
 import os
+import string
+import binascii
 import itertools
+import weakref
+import threading
+import multiprocessing
+import cPickle as pickle
 
 from Crypto.Cipher import AES
-from collections import defaultdict
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 from commons import *
-
-def _block_size_padding(oracle):
-    last = oracle('')
-    for i in itertools.count(1):
-        current = oracle('A'*i)
-        if len(current) > len(last):
-            last = current
-            break
-        last = current
-    for size in [8, 16, 24, 32]:
-        if len(oracle('A'*(i+size))) > len(last):
-            return (size, i)
+from analysis import ASCII_PRINTABLE_FREQS
 
 def _prefix_similarity(x, y):
     i = 0
@@ -25,25 +21,90 @@ def _prefix_similarity(x, y):
         i += 1
     return i
 
-def _ecb_prefix_size(oracle, block_size=16):
-    last = oracle('')
-    target_sim = 0
-    for i in itertools.count(1):
-        current = oracle('A'*i)
-        sim = _prefix_similarity(current, last)
-        if sim >= block_size:
-            if i == 1:
-                target_sim = block_size*(sim/block_size) + block_size
-            elif sim > target_sim:
-                # check against a non-prefix byte interfering with the filler bytes
-                if _prefix_similarity(oracle('B'*i), oracle('B'*(i-1))) > target_sim:
-                    prefix_size = block_size*(sim/block_size)-i+1
-                    block_end = block_size*(sim/block_size)
-                    if i % block_size == 1:
-                        block_end -= block_size
-                    return (prefix_size, block_end)
-        last = current
+class Calibration(object):
+    """Layout of the plaintext behind an ECB oracle, as found by `ecb_calibrate`.
+
+    `prefix_block_end` is the end of the last block the unknown prefix reaches
+    into, `pt_len` the length of the unknown plaintext after our input and
+    `queries` the number of oracle queries calibration took.
+    """
+    def __init__(self, block_size, pad_size, prefix_size, prefix_block_end, pt_len, queries=0):
+        self.block_size = block_size
+        self.pad_size = pad_size
+        self.prefix_size = prefix_size
+        self.prefix_block_end = prefix_block_end
+        self.pt_len = pt_len
+        self.queries = queries
+
+    def as_dict(self):
+        """The calibration as stored in `AttackSession.calibration`."""
+        return {'block_size': self.block_size, 'pad_size': self.pad_size,
+                'prefix_size': self.prefix_size, 'prefix_block_end': self.prefix_block_end,
+                'pt_len': self.pt_len}
+
+    def __repr__(self):
+        return 'Calibration(%r)' % self.as_dict()
+
+# calibrations by oracle, for as long as the oracle is alive
+_CALIBRATIONS = weakref.WeakKeyDictionary()
+
+def _ecb_calibrate(key, oracle, max_block_size=32, workers=None, refresh=False):
+    """`ecb_calibrate` querying `oracle`, cached under `key`."""
+    if not refresh:
+        try:
+            return _CALIBRATIONS[key]
+        except (KeyError, TypeError):
+            pass
+    # lengths up to max_block_size+1 cover the padding jump and the prefix
+    # alignment of any block size; the long one detects ECB
+    lengths = range(max_block_size + 2)
+    probes = ['A'*i for i in lengths] + ['B'*i for i in lengths] + ['A'*(3*max_block_size)]
+    if hasattr(oracle, 'batch'):
+        responses = oracle.batch(probes)
+    else:
+        batch_oracle = ThreadedOracle(oracle, workers) if workers else SerialOracle(oracle)
+        try:
+            responses = batch_oracle.batch(probes)
+        finally:
+            batch_oracle.close()
+    a, b = responses[:len(lengths)], responses[len(lengths):2*len(lengths)]
+    if not is_ecb_mode(responses[-1]):
+        raise Exception('Encryption mode is not ECB')
+
+    # the ciphertext grows by a block once our input fills the padding
+    pad_size = next((i for i in lengths if len(a[i]) > len(a[0])), None)
+    if pad_size is None:
+        raise Exception('Block size larger than %d' % max_block_size)
+    bsize = len(a[pad_size]) - len(a[0])
+
+    # blocks before the one holding the last input byte don't change when
+    # the input grows by one byte; two fillers rule out plaintext matching one
+    fixed = [min(_prefix_similarity(a[i], a[i+1]), _prefix_similarity(b[i], b[i+1])) / bsize
+             for i in range(bsize + 1)]
+    i = next(i for i in range(bsize) if fixed[i+1] > fixed[i])
+    prefix_size = bsize*fixed[i+1] - i - 1
+    prefix_block_end = bsize * ((prefix_size + bsize - 1) / bsize)
+    filler_len = prefix_block_end - prefix_size
+    pt_len = len(a[filler_len]) - prefix_block_end - ((pad_size - filler_len) % bsize or bsize)
+
+    cal = Calibration(bsize, pad_size, prefix_size, prefix_block_end, pt_len, len(probes))
+    try:
+        _CALIBRATIONS[key] = cal
+    except TypeError:
+        # not weakly referenceable, e.g. a bound method
+        pass
+    return cal
 
+def ecb_calibrate(oracle, max_block_size=32, workers=None, refresh=False):
+    """Finds block size, padding, prefix size and plaintext length behind an ECB
+    oracle, returning a `Calibration`.
+
+    All the probes (fillers of 0 to max_block_size+1 bytes, of two different
+    characters) are sent as one batch, `workers` at a time if set, or through
+    the oracle's own `batch` method if it has one. Results are cached per
+    oracle for as long as it is alive; set `refresh` to calibrate again.
+    """
+    return _ecb_calibrate(oracle, oracle, max_block_size, workers, refresh)
 
 def pkcs7_pad(data, block_size=16):
     """Calculate and append pkcs7 padding. Block size can be defined dynamically."""
@@ -70,21 +131,206 @@ def pkcs7_unpad_strict(data, block_size=16):
             raise Exception('Invalid padding character')
     return data[:-ord(pad)]
 
+ECB_WINDOW_SIZE = 1 << 20
+
+def _ecb_repeats(ct, block_size=16, limit=None):
+    """Number of aligned blocks of ct that repeat an earlier block, and the
+    number of blocks. Stops counting once `limit` repeats are found.
+    """
+    seen = set()
+    repeats = blocks = 0
+    for window in iter_windows(as_buffer(ct), ECB_WINDOW_SIZE // block_size * block_size):
+        chunk = [window[i:i+block_size] for i in xrange(0, len(window) - block_size + 1, block_size)]
+        seen.update(chunk)
+        blocks += len(chunk)
+        repeats = blocks - len(seen)
+        if limit is not None and repeats >= limit:
+            break
+    return repeats, blocks
+
+def ecb_confidence(ct, block_size=16):
+    """Likelihood that ciphertext is in ECB mode, from 0 to 1: the share of its
+    aligned blocks that repeat an earlier block (1 when all blocks are equal).
+
+    Other modes practically never repeat a block, so anything above 0 points
+    to ECB; higher values mean more repeated plaintext to work with.
+    """
+    repeats, blocks = _ecb_repeats(ct, block_size)
+    if blocks < 2:
+        return 0.0
+    return repeats / float(blocks - 1)
+
 def is_ecb_mode(ct, block_size=16, threshold=1):
     """Detect if ciphertext is in ECB mode.
     
-    Requires at least `threshold` overlapping blocks to be identical.
+    Requires at least `threshold` aligned blocks to repeat an earlier block.
     Make sure plaintext satisfies this property to get a correct result.
-    E.g.: for block_size=16, threshold=1, 48 same consecutive bytes are enough.
+    E.g.: for block_size=16, threshold=1, 47 same consecutive bytes are enough.
+
+    `ct` can also be a buffer (bytearray, memoryview, mmap) or a file, which is
+    read one ECB_WINDOW_SIZE window at a time. Scanning stops as soon as enough
+    repeats are found; until then every distinct block seen is kept in memory.
     """ 
-    blocks = defaultdict(int)
-    for i in xrange(0, len(ct)-block_size):
-        blocks[ct[i:i+block_size]] += 1
-    if sum(blocks.values()) >= len(blocks)+threshold:
+    if threshold <= 0:
         return True
-    return False
+    return _ecb_repeats(ct, block_size, threshold)[0] >= threshold
+
+def _decode_line(line, encoding=None):
+    """Ciphertext of a hex or base64 line, guessing which if `encoding` is None.
+    Returns None if the line doesn't decode.
+    """
+    if encoding is None:
+        encoding = 'hex' if not line.translate(None, string.hexdigits) and len(line) % 2 == 0 else 'base64'
+    try:
+        return line.decode(encoding)
+    except (TypeError, ValueError, binascii.Error):
+        return None
 
-def ecb_oracle_decrypt(oracle, allowed_chars=None):
+def _ecb_scan_line(lineno, line, block_size, encoding):
+    ct = _decode_line(line, encoding)
+    if ct is None:
+        return None
+    repeats, blocks = _ecb_repeats(ct, block_size)
+    confidence = repeats / float(blocks - 1) if blocks > 1 else 0.0
+    return (lineno, confidence, repeats, line)
+
+def _ecb_scan_lines(lines, block_size, encoding):
+    """`_ecb_scan_line` results of the non blank lines, and the number of lines."""
+    results = []
+    lineno = 0
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if line:
+            result = _ecb_scan_line(lineno, line, block_size, encoding)
+            if result is not None:
+                results.append(result)
+    return results, lineno
+
+def _ecb_scan_range(args):
+    """`_ecb_scan_lines` of the lines of a file starting within [start, end)."""
+    path, start, end, block_size, encoding = args
+    with open(path, 'rb') as f:
+        if start:
+            # a line belongs to the range it starts in
+            f.seek(start - 1)
+            f.readline()
+        def lines():
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                yield line
+        return _ecb_scan_lines(lines(), block_size, encoding)
+
+def ecb_scan(source, block_size=16, encoding=None, workers=None, top_results=None):
+    """Ranks ciphertexts by their likelihood of being in ECB mode (see `ecb_confidence`).
+
+    `source` is a path or an open file with one hex or base64 ciphertext per line,
+    or an iterable of such lines. `encoding` can force 'hex' or 'base64',
+    otherwise every line is guessed separately. Blank lines and lines that
+    don't decode are skipped.
+
+    If `workers` is set and `source` is a path, the file is split in byte
+    ranges that a process pool of that size reads and scores independently,
+    so only the results travel between processes.
+
+    Returns a list of (line number, confidence, repeated blocks, line) tuples,
+    most likely first, up to `top_results` if set. Line numbers start at 1.
+    """
+    if workers and isinstance(source, basestring):
+        size = os.path.getsize(source)
+        step = max(size // (workers * 4), 1)
+        jobs = [(source, i, min(i + step, size), block_size, encoding) for i in xrange(0, size, step)]
+        pool = multiprocessing.Pool(workers)
+        try:
+            parts = pool.map(_ecb_scan_range, jobs)
+        finally:
+            pool.close()
+            pool.join()
+        results = []
+        offset = 0
+        for part, count in parts:
+            results.extend((r[0] + offset,) + r[1:] for r in part)
+            offset += count
+    elif isinstance(source, basestring):
+        with open(source, 'rb') as f:
+            results = _ecb_scan_lines(f, block_size, encoding)[0]
+    else:
+        results = _ecb_scan_lines(source, block_size, encoding)[0]
+    ranked = sorted(results, key=lambda r: (-r[1], -r[2], r[0]))
+    return ranked[:top_results] if top_results else ranked
+
+def _ecb_dictionary_byte(oracle, filler, pt, bsize, pblock_end, allowed_chars, max_input=None):
+    """Recover the byte following `pt` by packing one candidate block per
+    allowed character in front of the alignment bytes, so that a single
+    query returns both the lookup dictionary and the target block.
+    """
+    known = ('A'*bsize + pt)[-(bsize-1):]
+    extra = 'A'*(bsize - (len(pt) % bsize) - 1)
+    per_query = len(allowed_chars)
+    if max_input is not None:
+        per_query = (max_input - len(filler) - len(extra)) / bsize
+        if per_query < 1:
+            raise Exception('Oracle input limit too small for dictionary mode')
+    for i in xrange(0, len(allowed_chars), per_query):
+        chars = allowed_chars[i:i+per_query]
+        ct = oracle(filler + ''.join(known + c for c in chars) + extra)
+        target_start = pblock_end + bsize * (len(chars) + len(pt) / bsize)
+        target = ct[target_start:target_start+bsize]
+        for j, c in enumerate(chars):
+            if ct[pblock_end+j*bsize:pblock_end+(j+1)*bsize] == target:
+                return c
+
+def iter_ecb_oracle_decrypt(oracle, allowed_chars=None, cache=True, dictionary=False,
+                            max_input=None, session=None, workers=None, calibration=None):
+    """Generator version of `ecb_oracle_decrypt`, yielding plaintext bytes
+    as soon as they are recovered.
+
+    If `session` is given, calibration results, recovered bytes and oracle
+    stats are checkpointed to it. A resumed `AttackSession` skips calibration
+    and continues where it stopped, yielding the bytes it already holds first.
+    """
+    raw_oracle = oracle
+    oracle = _cached(oracle, cache)
+    if session is None:
+        session = AttackSession()
+    if not allowed_chars:
+        allowed_chars = [chr(i) for i in range(256)]
+    if not session.calibration:
+        if calibration is None:
+            calibration = _ecb_calibrate(raw_oracle, oracle, workers=workers)
+        session.calibration = calibration.as_dict()
+        session.save()
+    cal = session.calibration
+    bsize, pblock_end, pt_len = cal['block_size'], cal['prefix_block_end'], cal['pt_len']
+    filler = 'A' * (pblock_end - cal['prefix_size'])
+    pt = session.pt
+    if pt:
+        yield pt
+    while len(pt) < pt_len:
+        if dictionary:
+            c = _ecb_dictionary_byte(oracle, filler, pt, bsize, pblock_end, allowed_chars, max_input)
+        else:
+            c = None
+            extra = filler + 'A'*(bsize - (len(pt) % bsize) - 1)
+            window_end = pblock_end + bsize * ((len(pt) / bsize) + 1)
+            # check the actual ciphertext
+            ct = oracle(extra)[pblock_end:window_end]
+            # find all ciphertexts of controlled + 1 extra byte
+            for candidate_char in allowed_chars:
+                candidate = extra + pt + candidate_char
+                if oracle(candidate)[pblock_end:window_end] == ct:
+                    c = candidate_char
+                    break
+        if c is None:
+            raise Exception('Error decrypting ECB: byte not found')
+        pt += c
+        session.record(c, **(oracle.stats() if isinstance(oracle, CachedOracle) else {}))
+        yield c
+    session.save()
+
+def ecb_oracle_decrypt(oracle, allowed_chars=None, cache=True, dictionary=False, max_input=None,
+                       session=None, workers=None, calibration=None):
     """Given an oracle which returns ciphertexts based on input plaintexts,
     it will decrypt the bytes to the right of the injection point.
 
@@ -93,85 +339,384 @@ def ecb_oracle_decrypt(oracle, allowed_chars=None):
 
     `allowed_chars` defines the characters to use for guessing plaintexts.
     Defaults to all 256 byte values.
+
+    Unless `cache` is False, repeated queries are answered from a `CachedOracle`.
+    Pass your own `CachedOracle` to control its size or persist it to disk.
+
+    With `dictionary` set, the candidate blocks for all allowed characters are
+    sent in a single query, along with the block to be matched, so each byte
+    costs one query instead of up to 256. `max_input` limits the length of
+    these queries, splitting the candidates over several queries if needed.
+
+    Block size, padding and prefix are found by `ecb_calibrate`, which sends
+    its probes `workers` at a time if set. Pass a `Calibration` from an
+    earlier call as `calibration` to skip it.
+
+    Progress can be checkpointed to an `AttackSession`;
+    see `iter_ecb_oracle_decrypt`.
     """
-    if not is_ecb_mode(oracle('A'*48)):
-        raise Exception('Encryption mode is not ECB')
-    if not allowed_chars:
-        allowed_chars = [chr(i) for i in range(256)]
-    bsize, padsize = _block_size_padding(oracle)
-    psize, pblock_end = _ecb_prefix_size(oracle)
-    filler = 'A' * (pblock_end - psize)
-    # calculated length of the bytes to be decrypted
-    pt_len = len(oracle(filler)[pblock_end:]) - ((padsize - len(filler)) % bsize or bsize)
-    pt = ''
-    while len(pt) < pt_len:
-        found = False
-        extra = filler + 'A'*(bsize - (len(pt) % bsize) - 1)
-        window_end = pblock_end + bsize * ((len(pt) / bsize) + 1)
-        # check the actual ciphertext
-        ct = oracle(extra)[pblock_end:window_end]
-        # find all ciphertexts of controlled + 1 extra byte
-        for c in allowed_chars:
-            candidate = extra + pt + c
-            if oracle(candidate)[pblock_end:window_end] == ct:
-                found = True
-                pt += c
+    return ''.join(iter_ecb_oracle_decrypt(oracle, allowed_chars, cache, dictionary,
+                                           max_input, session, workers, calibration))
+
+class CachedOracle(object):
+    """Memoizing oracle wrapper with a bounded LRU cache.
+
+    Keeps the `maxsize` most recently used responses (unbounded if None)
+    and counts cache hits/misses. If `path` is given, every new response
+    is also appended to that file and responses already stored there are
+    loaded on creation, so an interrupted attack can resume without
+    repeating its queries. Thread-safe.
+    """
+    def __init__(self, oracle, maxsize=4096, path=None):
+        self.oracle = oracle
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            if os.path.exists(path):
+                self._load(path)
+            self._file = open(path, 'ab')
+
+    def _load(self, path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    query, response = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    # end of file, or a record cut short by a crash
+                    break
+                self._store(query, response)
+
+    def _store(self, query, response):
+        self._cache[query] = response
+        if self.maxsize is not None and len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def __call__(self, query):
+        with self._lock:
+            if query in self._cache:
+                self.hits += 1
+                response = self._cache.pop(query)
+                self._cache[query] = response
+                return response
+            self.misses += 1
+        response = self.oracle(query)
+        with self._lock:
+            self._store(query, response)
+            if self._file:
+                pickle.dump((query, response), self._file, pickle.HIGHEST_PROTOCOL)
+                self._file.flush()
+        return response
+
+    def stats(self):
+        """Returns a dictionary with the cache hits, misses and current size."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache)}
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+def _cached(oracle, cache=True):
+    if cache and not isinstance(oracle, CachedOracle):
+        return CachedOracle(oracle)
+    return oracle
+
+class AttackSession(object):
+    """Checkpointed progress of a long running oracle attack.
+
+    Holds the recovered plaintext (`pt`), the attack's calibration results
+    and oracle stats. If `path` is given, they are saved there every
+    `interval` recovered bytes and when the attack completes; an existing
+    file is loaded on creation, so the attack resumes where it stopped.
+    A session must only be resumed by the same attack against the same target.
+    """
+    def __init__(self, path=None, interval=16):
+        self.path = path
+        self.interval = interval
+        self.pt = ''
+        self.calibration = {}
+        self.stats = {}
+        self._unsaved = 0
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.pt, self.calibration, self.stats = pickle.load(f)
+
+    def record(self, data, **stats):
+        """Append recovered bytes and update stats, checkpointing if due."""
+        self.pt += data
+        self.stats.update(stats)
+        self._unsaved += len(data)
+        if self._unsaved >= self.interval:
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        # write to a temporary file first so a crash never leaves a partial checkpoint
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((self.pt, self.calibration, self.stats), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self.path)
+        self._unsaved = 0
+
+class SerialOracle(object):
+    """Batch interface over a plain oracle function.
+
+    Candidates are queried one after another, stopping at the first
+    valid one if `first_only` is set.
+    """
+    def __init__(self, oracle):
+        self.oracle = oracle
+
+    def batch(self, candidates, first_only=False):
+        results = []
+        for candidate in candidates:
+            result = self.oracle(candidate)
+            results.append(result)
+            if result and first_only:
                 break
-        if not found:
-            raise Exception('Error decrypting ECB: byte not found')
-    return pt
+        return results
 
-def cbc_padding_oracle_decrypt(ct, oracle, block_size=16):
-    """Given a ciphertext and an oracle which returns if input has
-    valid pkcs7 padding or not it will decrypt all blocks, except the first.
+    def close(self):
+        pass
 
-    `ct` must be encrypted in CBC mode.
-    `oracle` must be a function that returns True/False based on valid *pkcs7* padding.
+class ThreadedOracle(SerialOracle):
+    """Batch interface that sends candidates to the oracle concurrently,
+    `workers` queries at a time.
+
+    With `first_only` set, no further queries are sent once a round
+    contains a valid candidate. Thread-safe; a single instance can be
+    shared between several decrypting threads.
+    """
+    def __init__(self, oracle, workers=16):
+        super(ThreadedOracle, self).__init__(oracle)
+        self.workers = workers
+        self._pool = ThreadPool(workers)
+
+    def batch(self, candidates, first_only=False):
+        results = []
+        for i in xrange(0, len(candidates), self.workers):
+            current = self._pool.map(self.oracle, candidates[i:i+self.workers])
+            results.extend(current)
+            if first_only and any(current):
+                break
+        return results
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+def _complete_order(guesses):
+    """Append any byte values missing from `guesses`, keeping its order."""
+    seen = set(guesses)
+    return list(guesses) + [i for i in range(256) if i not in seen]
+
+_PRINTABLE_ORDER = _complete_order([ord(c) for c in string.printable])
+
+def _frequency_ranking():
+    ranking = []
+    for c in sorted(ASCII_PRINTABLE_FREQS, key=ASCII_PRINTABLE_FREQS.get, reverse=True):
+        # frequencies are case insensitive; lowercase is far more common in text
+        if c in string.ascii_uppercase:
+            ranking.append(ord(c.lower()))
+        ranking.append(ord(c))
+    return _complete_order(ranking)
+
+_FREQUENCY_ORDER = _frequency_ranking()
+
+def printable_order(known, block_size, final):
+    """Candidate ordering: printable ASCII first, then all other bytes."""
+    return _PRINTABLE_ORDER
+
+def frequency_order(known, block_size, final):
+    """Candidate ordering: bytes ranked by english text frequency."""
+    return _FREQUENCY_ORDER
+
+def pkcs7_order(fallback=frequency_order):
+    """Returns a candidate ordering that tries the expected pkcs7 padding bytes
+    first when decrypting the final block and uses `fallback` everywhere else.
+    """
+    def order(known, block_size, final):
+        if final:
+            if not known:
+                return _complete_order(range(1, block_size+1))
+            pad = ord(known[-1])
+            if len(known) < pad <= block_size:
+                return _complete_order([pad] + fallback(known, block_size, final))
+        return fallback(known, block_size, final)
+    return order
+
+def _cbc_padding_oracle_block(prevb, block, oracle, block_size=16, progress=None, index=1,
+                              order=None, final=False):
+    """Decrypt a single CBC block, given the ciphertext block preceding it."""
+    known = ''
+    calls = 0
+    while len(known) < block_size:
+        prefix_len = block_size - len(known) - 1
+        prefix = '\x00'*prefix_len
+        pad_len = len(known) + 1
+        pad_partial = sxor(prevb[prefix_len+1:], known, chr(pad_len)*len(known))
+        if order:
+            # convert plaintext guesses to the byte values that decrypt to them
+            guesses = _complete_order(order(known, block_size, final))
+            candidates = [ord(prevb[-pad_len]) ^ pad_len ^ g for g in guesses]
+        else:
+            candidates = range(256)
+        crafted = [prefix + chr(i) + pad_partial + block for i in candidates]
+        start = 0
+        while True:
+            results = oracle.batch(crafted[start:], first_only=True)
+            calls += len(results)
+            hits = [start+i for i, valid in enumerate(results) if valid]
+            if not hits:
+                raise Exception('Error decrypting byte: no valid padding found')
+            if known:
+                break
+            # The last byte might have produced \x02\x02 (or longer) padding instead of \x01.
+            # Changing the byte before it only keeps the padding valid if it ends in \x01.
+            confirm = prefix[:-1] + chr(ord(prefix[-1]) ^ 1) + chr(candidates[hits[0]]) + block
+            calls += 1
+            if oracle.batch([confirm])[0]:
+                break
+            start = hits[0] + 1
+        known = chr(ord(prevb[-pad_len]) ^ (pad_len ^ candidates[hits[0]])) + known
+        if progress:
+            progress(index, len(known), calls)
+    return known, calls
+
+def iter_cbc_padding_oracle_decrypt(ct, oracle, block_size=16, workers=None, progress=None,
+                                    order=None, cache=True, session=None):
+    """Generator version of `cbc_padding_oracle_decrypt`, yielding the plaintext
+    of every block as soon as it and all blocks before it are recovered.
+
+    If `session` is given, recovered blocks and the oracle call count are
+    checkpointed to it. A resumed `AttackSession` continues from the first
+    block it doesn't hold, yielding the plaintext it already holds first.
     """
     if len(ct) / block_size < 2:
         raise Exception('At least 2 blocks required')
     if len(ct) % block_size != 0:
         raise Exception('Invalid ciphertext size')
-    iblocks = ichunked(ct, block_size)
-    prevb = iblocks.next()
-    pt = ''
-    for block in iblocks:
-        known = ''
-        while len(known) < block_size:
-            prefix_len = block_size - len(known) - 1
-            prefix = '\x00'*prefix_len
-            pad_len = len(known) + 1
-            pad_partial = sxor(prevb[prefix_len+1:], known, chr(pad_len)*len(known))
-            while True:
-                hits = 0
-                for i in range(256):
-                    crafted = prefix + chr(i) + pad_partial + block
-                    if oracle(crafted):
-                        hits += 1
-                        pt_byte = ord(prevb[-pad_len]) ^ (pad_len ^ i)
-                        # We try all 256 values for the last byte; for the rest we don't have to.
-                        if len(known) > 0:
-                            break
-                if hits > 1:
-                    # Make sure the last byte is \x01 by avoiding prefixes
-                    # that generate more than 1 valid paddings in the next block.
-                    prefix = os.urandom(prefix_len)
-                elif hits == 0:
-                    raise Exception('Error decrypting byte: no valid padding found')
-                else:
-                    known = chr(pt_byte) + known
-                    break
-        pt += known
-        prevb = block
-    return pt
-
-def _ctr_counter(nonce, start=0):
-    if len(nonce) != 8:
-        raise Exception("Nonce must be 8 bytes long")
-    ctr = le_cyclic_counter(start)
-    def inc():
-        return nonce + ctr()
-    return inc
+    if session is None:
+        session = AttackSession()
+    if not session.calibration:
+        session.calibration = {'block_size': block_size}
+    if session.pt:
+        yield session.pt
+    blocks = chunked(ct, block_size)
+    remaining = range(len(session.pt) / block_size + 1, len(blocks))
+    if hasattr(oracle, 'batch'):
+        batch_oracle = oracle
+    elif workers:
+        batch_oracle = ThreadedOracle(_cached(oracle, cache), workers)
+    else:
+        batch_oracle = SerialOracle(_cached(oracle, cache))
+    def decrypt_block(i):
+        return _cbc_padding_oracle_block(blocks[i-1], blocks[i], batch_oracle, block_size,
+                                         progress, i, order, i == len(blocks)-1)
+    pool = None
+    try:
+        if workers and remaining:
+            pool = ThreadPool(min(workers, len(remaining)))
+            results = pool.imap(decrypt_block, remaining)
+        else:
+            results = itertools.imap(decrypt_block, remaining)
+        for known, calls in results:
+            session.record(known, oracle_calls=session.stats.get('oracle_calls', 0) + calls)
+            yield known
+        session.save()
+    finally:
+        if pool:
+            pool.terminate()
+        if batch_oracle is not oracle:
+            batch_oracle.close()
+
+def cbc_padding_oracle_decrypt(ct, oracle, block_size=16, workers=None, progress=None,
+                               order=None, cache=True, session=None):
+    """Given a ciphertext and an oracle which returns if input has
+    valid pkcs7 padding or not it will decrypt all blocks, except the first.
+
+    `ct` must be encrypted in CBC mode.
+    `oracle` must be a function that returns True/False based on valid *pkcs7* padding.
+    It can also be an object with a `batch(candidates, first_only)` method,
+    like `ThreadedOracle`, which is then used for all queries.
+
+    If `workers` is set, candidates for each byte are sent to the oracle
+    `workers` at a time and all blocks are decrypted in parallel, since
+    each one only depends on its preceding ciphertext block.
+
+    `progress`, if given, is called with (block_index, recovered_bytes, oracle_calls)
+    every time a byte is recovered. Block indices start at 1 (block 0 is the IV).
+
+    `order` is a candidate ordering strategy: a function of (known, block_size, final)
+    returning plaintext byte values in the order they should be tried, where `known`
+    holds the bytes recovered so far in the current block and `final` is set for the
+    last block. See `printable_order`, `frequency_order` and `pkcs7_order`.
+    Defaults to trying all byte values in numeric order.
+
+    Unless `cache` is False, plain oracle functions are wrapped in a `CachedOracle`.
+
+    Progress can be checkpointed to an `AttackSession`;
+    see `iter_cbc_padding_oracle_decrypt`.
+    """
+    return ''.join(iter_cbc_padding_oracle_decrypt(ct, oracle, block_size, workers, progress,
+                                                   order, cache, session))
+
+# keystream generated per AES call by AesCtr, in blocks
+CTR_BATCH_BLOCKS = 1 << 16
+
+class AesCtr(object):
+    """AES in CTR mode, with the counter blocks of `aes_ctr_encrypt`: the
+    8 byte nonce followed by an 8 byte little endian block counter from 0.
+
+    Counter blocks are built in bulk and encrypted a batch at a time in ECB
+    mode. `offset` (or `seek`) positions the keystream at any byte, so any
+    part of a message can be encrypted or decrypted on its own.
+    """
+
+    def __init__(self, key, nonce, offset=0):
+        if len(nonce) != 8:
+            raise Exception("Nonce must be 8 bytes long")
+        self.nonce = nonce
+        self._ecb = AES.new(key, AES.MODE_ECB)
+        self.seek(offset)
+
+    def seek(self, offset):
+        """Move to byte `offset` of the keystream."""
+        if offset < 0:
+            raise Exception("Offset cannot be negative")
+        self.offset = offset
+
+    def tell(self):
+        return self.offset
+
+    def keystream(self, size):
+        """The next `size` bytes of keystream."""
+        out = []
+        end = self.offset + size
+        while self.offset < end:
+            block, skip = divmod(self.offset, 16)
+            count = min(-(-(end - block * 16) // 16), CTR_BATCH_BLOCKS)
+            ks = self._ecb.encrypt(le_counter_blocks(self.nonce, block, count))
+            out.append(ks[skip:end - block * 16])
+            self.offset += len(out[-1])
+        return ''.join(out)
+
+    def encrypt(self, data):
+        """Xor `data` (str, bytearray or memoryview) with the next len(data)
+        bytes of keystream.
+        """
+        return nxor(data, self.keystream(len(data)))
+
+    decrypt = encrypt
+
+def _ctr_stream(cipher, src, dst, chunk_size):
+    for chunk in iter(lambda: src.read(chunk_size), b''):
+        dst.write(cipher.encrypt(chunk))
 
 def aes_ctr_encrypt(key, pt, nonce=None):
     """Encrypt a plaintext using AES in CTR mode.
@@ -183,8 +728,7 @@ def aes_ctr_encrypt(key, pt, nonce=None):
     """
     if nonce is None:
         nonce = os.urandom(8)
-    cipher = AES.new(key, AES.MODE_CTR, counter=_ctr_counter(nonce))
-    return nonce + cipher.encrypt(pt)
+    return nonce + AesCtr(key, nonce).encrypt(pt)
 
 def aes_ctr_decrypt(key, ct):
     """Decrypt a ciphertext that has been encrypted using CTR mode.
@@ -192,5 +736,20 @@ def aes_ctr_decrypt(key, ct):
     The encrypting function must be (or model) `aes_ctr_encrypt`.
     """
     nonce = ct[:8]
-    cipher = AES.new(key, AES.MODE_CTR, counter=_ctr_counter(nonce))
-    return cipher.decrypt(ct[8:])
+    return AesCtr(key, nonce).decrypt(ct[8:])
+
+def aes_ctr_encrypt_file(key, src, dst, nonce=None, chunk_size=1 << 20):
+    """`aes_ctr_encrypt` from file object `src` to file object `dst`,
+    `chunk_size` bytes at a time.
+    """
+    if nonce is None:
+        nonce = os.urandom(8)
+    dst.write(nonce)
+    _ctr_stream(AesCtr(key, nonce), src, dst, chunk_size)
+
+def aes_ctr_decrypt_file(key, src, dst, chunk_size=1 << 20):
+    """`aes_ctr_decrypt` from file object `src` to file object `dst`,
+    `chunk_size` bytes at a time.
+    """
+    nonce = src.read(8)
+    _ctr_stream(AesCtr(key, nonce), src, dst, chunk_size)
@@ -1,15 +1,108 @@
+import os
 import math
+import mmap
 import socket
 import struct
+import binascii
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 LONG_LONG_LIMIT = 18446744073709551615
 
-def _sxor(x,y):
-    return ''.join(chr(ord(xi) ^ ord(yi)) for xi,yi in zip(x,y))
+def _np_bytes(x):
+    """uint8 array over the buffer of x, without copying it."""
+    if isinstance(x, memoryview):
+        return np.asarray(x)
+    return np.frombuffer(x, dtype=np.uint8)
+
+_XOR_TABLES = []
+
+def _xor_tables():
+    """256 translation tables, the k-th one xoring every byte with k."""
+    if not _XOR_TABLES:
+        _XOR_TABLES.extend(str(bytearray(i ^ k for i in xrange(256))) for k in xrange(256))
+    return _XOR_TABLES
+
+# inputs nxor reads as bytes directly; anything else is a sequence of characters
+_BYTE_BUFFERS = (str, bytearray, memoryview, buffer, mmap.mmap)
+
+def nxor(*xs):
+    """Xor any number of byte strings (str, bytearray or memoryview) together,
+    truncating to the shortest one. Returns a str.
+
+    Other sequences of characters (unicode, lists of 1 char strings) are
+    taken character by character, like `sxor` always did; characters
+    above \\xff raise ValueError.
+
+    Whole buffers are xored at once, with NumPy if available or as
+    arbitrary precision integers otherwise.
+    """
+    if not xs:
+        return ''
+    xs = [x if isinstance(x, _BYTE_BUFFERS) else bytearray(map(ord, x)) for x in xs]
+    n = min(len(x) for x in xs)
+    if n == 0:
+        return ''
+    if np is not None:
+        out = _np_bytes(xs[0])[:n].copy()
+        for x in xs[1:]:
+            out ^= _np_bytes(x)[:n]
+        return out.tostring()
+    d = 0
+    for x in xs:
+        d ^= long(binascii.hexlify(bytearray(x[:n])), 16)
+    return ('%0*x' % (2*n, d)).decode('hex')
+
+def xor_repeat(data, key):
+    """Xor `data` with repeating `key`, without building the repeated key."""
+    n, k = len(data), len(key)
+    if n == 0:
+        return ''
+    if k == 0:
+        raise Exception("Empty key")
+    if np is not None:
+        arr, key_arr = _np_bytes(data), _np_bytes(key)
+        full = n // k * k
+        out = np.empty(n, dtype=np.uint8)
+        np.bitwise_xor(arr[:full].reshape(-1, k), key_arr, out=out[:full].reshape(-1, k))
+        out[full:] = arr[full:] ^ key_arr[:n-full]
+        return out.tostring()
+    # every key byte xors one column of data, which translate does in place of a loop
+    data, tables = str(bytearray(data)), _xor_tables()
+    out = bytearray(n)
+    for i, kb in enumerate(bytearray(key[:n])):
+        out[i::k] = data[i::k].translate(tables[kb])
+    return str(out)
+
+def ixor(buf, key):
+    """In place xor of writable `buf` (bytearray or memoryview) with `key`,
+    repeated if it is shorter than buf. Returns buf.
+    """
+    if len(buf) == 0:
+        return buf
+    if len(key) == 0:
+        raise Exception("Empty key")
+    if np is not None:
+        arr = _np_bytes(buf)
+        if arr.flags.writeable:
+            key_arr = _np_bytes(key)
+            if len(key_arr) >= len(arr):
+                arr ^= key_arr[:len(arr)]
+            else:
+                full = len(arr) // len(key_arr) * len(key_arr)
+                rows = arr[:full].reshape(-1, len(key_arr))
+                rows ^= key_arr
+                arr[full:] ^= key_arr[:len(arr)-full]
+            return buf
+    buf[:] = xor_repeat(str(bytearray(buf)), key[:len(buf)])
+    return buf
 
 def sxor(*xs):
-    """Per byte string xor"""
-    return ''.join(reduce(_sxor, tup) for tup in zip(*xs))
+    """Per byte string xor. Same as `nxor`."""
+    return nxor(*xs)
 
 def d2s(d):
     """Decimal to string"""
@@ -32,6 +125,39 @@ def ichunked(l, n):
     """Lazy iterator of `chunked`"""
     for i in xrange(0, len(l), n):
         yield l[i:i + n]
+
+def map_file(path):
+    """Read-only memory map of the file at `path`, to pass large inputs
+    to the functions that accept buffers without reading them in memory.
+    """
+    with open(path, 'rb') as f:
+        return as_buffer(f)
+
+def as_buffer(source):
+    """Open files are memory mapped (read-only), anything else is returned as is.
+    The map stays valid after the file is closed.
+    """
+    if isinstance(source, file):
+        if os.fstat(source.fileno()).st_size == 0:
+            return ''
+        return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    return source
+
+def iter_windows(buf, size):
+    """Consecutive `size` byte windows of a str, bytearray, memoryview or mmap, as str.
+    Only one window is copied out of the buffer at a time.
+    """
+    for i in xrange(0, len(buf), size):
+        w = buf[i:i+size]
+        yield w.tobytes() if isinstance(w, memoryview) else str(w)
+
+def iter_xor_repeat(buf, key, size=1 << 20):
+    """Lazy `xor_repeat` of a buffer (see `iter_windows`), one window at a time."""
+    if not key:
+        raise Exception("Empty key")
+    size = max(size // len(key), 1) * len(key)
+    for w in iter_windows(buf, size):
+        yield xor_repeat(w, key)
         
 def blen(n):
     """Length of n in bytes. Also handles non-numeric data."""
@@ -63,7 +189,9 @@ def hamming_bin(x, y):
 
     hamming_bin('cat', 'dog') == 9
     """
-    return sum(bin(xi^yi).count('1') for xi,yi in zip(bytearray(x),bytearray(y)))
+    n = min(len(x), len(y))
+    # xor both strings as whole numbers and count the set bits in one go
+    return bin(s2d(str(bytearray(x[:n]))) ^ s2d(str(bytearray(y[:n])))).count('1')
 
 def le_cyclic_counter(start_at=0):
     """8 byte little endian cyclic counter that starts at specified position.
@@ -85,3 +213,22 @@ def le_cyclic_counter(start_at=0):
             d['counter'] += 1
         return struct.pack("<Q", val)
     return inc
+
+def le_counter_blocks(prefix, start, count):
+    """`count` consecutive blocks of `prefix` followed by the 8 byte little
+    endian counter of `le_cyclic_counter`, starting at `start`, as one string.
+    Built in bulk, with NumPy if available.
+    """
+    start &= LONG_LONG_LIMIT
+    if count <= 0:
+        return ''
+    if np is not None and len(prefix) == 8:
+        blocks = np.empty((count, 2), dtype='<u8')
+        blocks[:, 0] = np.frombuffer(prefix, dtype='<u8')[0]
+        # wraps around at 2**64 like the counter does
+        blocks[:, 1] = np.arange(count, dtype=np.uint64) + np.uint64(start)
+        return blocks.tostring()
+    # xrange can't go past sys.maxint, so offsets are added to start instead
+    counters = [(start + i) & LONG_LONG_LIMIT for i in xrange(count)]
+    return struct.pack('<' + '%dsQ' % len(prefix) * count,
+                       *[v for c in counters for v in (prefix, c)])
@@ -1,23 +1,66 @@
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+try:
+    pow(2, -1, 3)
+    _native_inverse = True
+except (TypeError, ValueError):
+    # Python < 3.8
+    _native_inverse = False
+
+BACKEND = 'gmpy2' if gmpy2 else 'python'
+
+def mpz(n):
+    """n in the fastest integer type available: a gmpy2 mpz, or n itself.
+    Worth it for values that go through a lot of big multiplications/divisions.
+    """
+    return gmpy2.mpz(n) if gmpy2 else n
+
+def _int(n):
+    return int(n) if gmpy2 else n
+
 def iroot(n, r):
     """Computes the integer root of order r of n"""
-    u, s = n, n+1
-    while u < s:
+    if gmpy2:
+        return int(gmpy2.iroot(n, r)[0])
+    if n < 2:
+        return n
+    # Newton's method from the smallest power of 2 above the root
+    s = 1 << -(-n.bit_length() // r)
+    while True:
+        u = ((r-1) * s + n // pow(s, r-1)) // r
+        if u >= s:
+            return s
         s = u
-        t = (r-1) * s + n // pow(s, r-1)
-        u = t // r
-    return s
 
 def isqrt(n):
     """Slightly more efficient than iroot for the special case of r=2"""
-    x = n
-    y = (x + 1) // 2
-    while y < x:
+    if gmpy2:
+        return int(gmpy2.isqrt(n))
+    if n < 2:
+        return n
+    x = 1 << -(-n.bit_length() // 2)
+    while True:
+        y = (x + n // x) >> 1
+        if y >= x:
+            return x
         x = y
-        y = (x + n // x) // 2
-    return x
+
+def gcd(a, b):
+    """Greatest common divisor of a and b, without the Bezout coefficients."""
+    if gmpy2:
+        return int(gmpy2.gcd(a, b))
+    while b:
+        a, b = b, a % b
+    return a
 
 def egcd(b, n):
     """Calculates GCD iteratively, using Euclid's algorithm."""
+    if gmpy2:
+        g, x, y = gmpy2.gcdext(b, n)
+        return int(g), int(x), int(y)
     x0, x1, y0, y1 = 1, 0, 0, 1
     while n != 0:
         q, b, n = b // n, n, b % n
@@ -26,20 +69,62 @@ def egcd(b, n):
     return  b, x0, y0
 
 def modinv(b, n):
-    g, x, _ = egcd(b, n)
-    if g == 1:
-        return x % n
+    """Inverse of b mod n, or None if there's none."""
+    if gmpy2:
+        try:
+            return int(gmpy2.invert(b, n))
+        except ZeroDivisionError:
+            return None
+    if _native_inverse:
+        try:
+            return pow(b, -1, n)
+        except ValueError:
+            return None
+    # egcd tracking only the coefficient of b
+    a, m, x0, x1 = b % n, n, 1, 0
+    while m:
+        q, a, m = a // m, m, a % m
+        x0, x1 = x1, x0 - q * x1
+    if a == 1:
+        return x0 % n
+
+class NotCoprimeError(ValueError):
+    """Raised by `CRT` for moduli that are not pairwise coprime."""
+
+class CRT(object):
+    """Chinese Remainder Theorem solver for a fixed set of pairwise coprime
+    moduli. The constants of Garner's algorithm are computed once, so
+    solving for many sets of residues only costs a few multiplications each.
+    """
+
+    def __init__(self, moduli):
+        self.moduli = [mpz(n_i) for n_i in moduli]
+        # product of the moduli before each one, and its inverse mod that one
+        self._prefix = []
+        self._inverses = []
+        prod = mpz(1)
+        for n_i in self.moduli:
+            c = modinv(prod % n_i, n_i)
+            if c is None:
+                raise NotCoprimeError("Moduli are not pairwise coprime")
+            self._prefix.append(prod)
+            self._inverses.append(mpz(c))
+            prod *= n_i
+        self.product = _int(prod)
+
+    def solve(self, a):
+        """Minimal x with x = a[i] mod moduli[i], for every i."""
+        x = mpz(0)
+        for n_i, prod, c, a_i in zip(self.moduli, self._prefix, self._inverses, a):
+            x += prod * ((a_i - x) * c % n_i)
+        return _int(x)
 
 def crt(n, a):
     """
     Solves the Chinese Remainder Theorem for moduli n and integers a,
-    returning the minimal solution x.
+    returning the minimal solution x. Use `CRT` to solve for the same
+    moduli repeatedly.
 
     https://en.wikipedia.org/wiki/Chinese_remainder_theorem
     """
-    x = 0
-    prod = reduce(lambda a, b: a*b, n)
-    for n_i, a_i in zip(n, a):
-        p = prod / n_i
-        x += a_i * modinv(p, n_i) * p
-    return x % prod
+    return CRT(n).solve(a)
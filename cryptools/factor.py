@@ -0,0 +1,215 @@
+# Factoring methods that break weak RSA moduli: primes too close together
+# (Fermat), p-1 smooth (Pollard p-1) or a small prime (Pollard rho).
+# Every method returns a non-trivial factor of n, or None once it runs out
+# of time (`deadline`, as returned by time.time()) or bound.
+import time
+import random
+import multiprocessing
+from collections import OrderedDict
+
+import cryptomath as m
+
+# how many steps the methods take between deadline checks
+_CHECK_EVERY = 1024
+
+def _expired(deadline):
+    return deadline is not None and time.time() >= deadline
+
+# squares mod 4096, to skip most isqrt calls of non squares
+_SQUARES_4096 = bytearray(4096)
+for _i in xrange(4096):
+    _SQUARES_4096[_i * _i % 4096] = 1
+
+def fermat(n, deadline=None, max_steps=None):
+    """Fermat's method: finds the factors of n quickly if they are close
+    to its square root.
+    """
+    if n % 2 == 0:
+        return 2
+    a = m.isqrt(n)
+    if a * a == n:
+        return a
+    a = m.mpz(a + 1)
+    b2 = a * a - n
+    steps = 0
+    while max_steps is None or steps < max_steps:
+        if _SQUARES_4096[int(b2 & 4095)]:
+            b = m.isqrt(b2)
+            if b * b == b2:
+                return int(a - b) if a - b > 1 else None
+        # (a+1)^2 - n
+        b2 += 2 * a + 1
+        a += 1
+        steps += 1
+        if steps % _CHECK_EVERY == 0 and _expired(deadline):
+            return None
+
+def _primes(bound):
+    """Primes up to `bound`, with a bytearray sieve."""
+    sieve = bytearray([1]) * (bound + 1)
+    sieve[:2] = b'\x00\x00'
+    for i in xrange(2, m.isqrt(bound) + 1):
+        if sieve[i]:
+            sieve[i*i::i] = bytearray(len(xrange(i*i, bound + 1, i)))
+    return [i for i in xrange(bound + 1) if sieve[i]]
+
+# bases pollard_pm1 tries, in order
+_PM1_BASES = _primes(60)
+
+# prime power tables of pollard_pm1, by bound
+_PRIME_POWERS = {}
+
+def _prime_powers(bound):
+    """(p, the largest power of p not above `bound`) for every prime p up to
+    `bound`. p-1 divides the product of the powers if it's `bound`-powersmooth.
+    """
+    table = _PRIME_POWERS.get(bound)
+    if table is None:
+        table = []
+        for p in _primes(bound):
+            q = p
+            while q * p <= bound:
+                q *= p
+            table.append((p, q))
+        _PRIME_POWERS[bound] = table
+    return table
+
+def _pm1_backtrack(n, a, entries):
+    """Redo the prime power `entries` from `a` one at a time, and the power
+    that completes every factor at once one prime at a time. Returns the
+    first gcd above 1, n if the factors still show up together.
+    """
+    for p, q in entries:
+        b = pow(a, q, n)
+        g = m.gcd(b - 1, n)
+        if g == n:
+            b = a
+            while q > 1:
+                b = pow(b, p, n)
+                g = m.gcd(b - 1, n)
+                if g > 1:
+                    return g
+                q //= p
+        if g > 1:
+            return g
+        a = b
+    return n
+
+def _pm1_base(n, a, table, deadline=None):
+    """pollard_pm1 from base `a`: a factor, n if the base finds every factor
+    at once, or None.
+    """
+    checkpoint = a
+    start = 0
+    for i, (_, q) in enumerate(table):
+        a = pow(a, q, n)
+        if (i + 1) % _CHECK_EVERY and i + 1 < len(table):
+            continue
+        g = m.gcd(a - 1, n)
+        if g == n:
+            # every factor found in the same batch
+            g = _pm1_backtrack(n, checkpoint, table[start:i+1])
+        if g > 1:
+            return g
+        if _expired(deadline):
+            return None
+        checkpoint = a
+        start = i + 1
+
+def pollard_pm1(n, bound=1 << 20, deadline=None):
+    """Pollard's p-1 method: finds a prime factor p of n if p-1 is
+    `bound`-powersmooth. The prime power table is built once per bound.
+    A base that finds every factor at once is retried with the next one.
+    """
+    if n % 2 == 0:
+        return 2
+    n = m.mpz(n)
+    table = _prime_powers(bound)
+    for base in _PM1_BASES:
+        g = m.gcd(base, n)
+        if g == 1:
+            g = _pm1_base(n, m.mpz(base), table, deadline)
+        if g is None:
+            return None
+        if g < n:
+            return int(g)
+        if _expired(deadline):
+            return None
+
+def pollard_rho(n, deadline=None, seed=None):
+    """Pollard's rho method with Brent's cycle detection: finds small prime
+    factors of n, in about the square root of the smallest one steps.
+    """
+    if n % 2 == 0:
+        return 2
+    rand = random.Random(seed)
+    y, c = rand.randrange(1, n), rand.randrange(1, n)
+    n = m.mpz(n)
+    while True:
+        y, c = m.mpz(y), m.mpz(c)
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for j in xrange(r):
+                y = (y * y + c) % n
+                if j % _CHECK_EVERY == _CHECK_EVERY - 1 and _expired(deadline):
+                    return None
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                # multiply the differences together, one gcd per batch
+                for _ in xrange(min(_CHECK_EVERY, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = m.gcd(q, n)
+                k += _CHECK_EVERY
+                if _expired(deadline):
+                    return None
+            r <<= 1
+        if g == n:
+            # the batch overshot: step through it again
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = m.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+        # cycled without a factor, try another polynomial
+        y, c = rand.randrange(1, int(n)), rand.randrange(1, int(n))
+
+# factoring methods available to factorize, by name
+METHODS = OrderedDict([('fermat', fermat), ('pm1', pollard_pm1), ('rho', pollard_rho)])
+
+def _factor_job(args):
+    name, n, timeout = args
+    start = time.time()
+    p = METHODS[name](n, deadline=start + timeout)
+    return name, p, time.time() - start
+
+def factorize(n, methods=None, timeout=60, workers=None):
+    """Tries to split n with `methods` (names from METHODS, all of them by
+    default), each for at most `timeout` seconds.
+
+    With `workers` set the methods run concurrently in a process pool of
+    that size, which is terminated as soon as one of them succeeds.
+    Otherwise they're tried one after the other.
+
+    Returns a (p, q, method name) tuple with p <= q, or None.
+    """
+    jobs = [(name, n, timeout) for name in (methods or METHODS)]
+    for name, _, _ in jobs:
+        if name not in METHODS:
+            raise Exception("Unknown factoring method: %s" % name)
+    if workers:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(_factor_job, jobs)
+    else:
+        pool = None
+        results = (_factor_job(job) for job in jobs)
+    try:
+        for name, p, _ in results:
+            if p:
+                return (min(p, n // p), max(p, n // p), name)
+    finally:
+        if pool is not None:
+            pool.terminate()
@@ -1,70 +1,118 @@
-import struct
+from multiprocessing.pool import ThreadPool
 
-from impl import sha1 as _sha1, md4 as _md4
-from commons import chunked
+from impl.sha1 import Sha1Hash
+from impl.md4 import MD4Hash
+from impl.md5 import MD5Hash
+from impl.sha2 import SHA256Hash, SHA512Hash
 
-def _sha1_pad(ptlen):
-    return b'\x80' + b'\x00' * ((56 - (ptlen + 1) % 64) % 64) + \
-           struct.pack(b'>Q', ptlen*8)
+# Merkle-Damgard hashes available to length_extend, by name.
+HASHES = {}
 
-def _sha1_extend(mac, pt, extension, prefix_len):
-    state = tuple([long(chunk, 16) for chunk in chunked(mac, 8)])
-    pad = _sha1_pad(prefix_len+len(pt))
-    crafted_m = pt + pad + extension
-    crafted_h = _sha1(extension, state, prefix_len+len(crafted_m)).hexdigest()
-    return (crafted_m, crafted_h)
+def register_hash(name, cls):
+    """Make hash class `cls` available to `length_extend` as `name`.
 
-def sha1_extend(mac, pt, extension, oracle=None, prefix_len=None, min_prefix=0, max_prefix=999):
-    """Extend given sha1 hex digest `mac` for plaintext `pt` with given `extension`.
+    `cls` has to follow `impl.md.MerkleDamgardHash`: take the internal state
+    and a fixed message length, implement `padding`, `state_from_digest`,
+    `update`, `copy` and `hexdigest`.
+    """
+    HASHES[name.lower()] = cls
 
-    It requires a pre-defined prefix length to be specified, or an oracle
-    that returns True/False based on its validity. You can also set the 
-    min/max prefix lenghts the function tests for, in the case it's unknown.
+for _name, _cls in [('sha1', Sha1Hash), ('md4', MD4Hash), ('md5', MD5Hash),
+                    ('sha256', SHA256Hash), ('sha512', SHA512Hash)]:
+    register_hash(_name, _cls)
 
-    The oracle receives the message that was crafted and the hex digest, in that order, all required.
-    
-    Returns a tuple of the successful message/digest. If no prefix length specified
-    and oracle never returned postive result it returns None.
-    """
-    if prefix_len is None and oracle is None:
-        raise Exception("Invalid state: Need prefix length or oracle")
-    if prefix_len is not None:
-        return _sha1_extend(mac, pt, extension, prefix_len)
-    else:
-        for i in xrange(min_prefix, max_prefix+1):
-            crafted_m, crafted_h = _sha1_extend(mac, pt, extension, i)
-            if oracle(crafted_m, crafted_h):
-                return (crafted_m, crafted_h)
+def _hash_class(algorithm):
+    try:
+        return HASHES[algorithm.lower()]
+    except KeyError:
+        raise Exception("Unknown hash algorithm: %s" % algorithm)
 
-def _md4_pad(ptlen):
-    return b'\x80' + b'\x00' * ((56 - (ptlen + 1) % 64) % 64) + \
-           struct.pack(b'<Q', ptlen*8)
+def _hasher(cls, mac, extension):
+    """Hasher resumed from the `mac` state, with the full blocks of `extension`
+    already processed. Only the padding depends on the prefix length,
+    so it can be reused for all of them.
+    """
+    return cls(cls.state_from_digest(mac.decode('hex'))).update(extension)
 
-def _md4_extend(mac, pt, extension, prefix_len):
-    state = [struct.unpack('<I', chunk.decode('hex'))[0] for chunk in chunked(mac, 8)]
-    pad = _md4_pad(prefix_len+len(pt))
+def _extend(cls, mac, pt, extension, prefix_len, hasher=None):
+    if hasher is None:
+        hasher = _hasher(cls, mac, extension)
+    pad = cls.padding(prefix_len+len(pt))
     crafted_m = pt + pad + extension
-    crafted_h = _md4(extension, state, prefix_len+len(crafted_m)).hexdigest()
+    h = hasher.copy()
+    h.fixed_byte_len = prefix_len+len(crafted_m)
+    crafted_h = h.hexdigest()
     return (crafted_m, crafted_h)
 
-def md4_extend(mac, pt, extension, oracle=None, prefix_len=None, min_prefix=0, max_prefix=999):
-    """Extend given md4 hex digest `mac` for plaintext `pt` with given `extension`.
+def extend_candidates(algorithm, mac, pt, extension, min_prefix=0, max_prefix=999):
+    """Yields a (prefix_len, message, hex digest) tuple for every prefix length
+    in `min_prefix`..`max_prefix`, extending `algorithm` hex digest `mac` for
+    plaintext `pt` with `extension`. The state and the full blocks of the
+    extension are hashed once; every candidate only finalizes its own padding.
+    """
+    cls = _hash_class(algorithm)
+    hasher = _hasher(cls, mac, extension)
+    for i in xrange(min_prefix, max_prefix+1):
+        crafted_m, crafted_h = _extend(cls, mac, pt, extension, i, hasher)
+        yield (i, crafted_m, crafted_h)
+
+def _first_valid(candidates, oracle, workers=None):
+    """Message/digest of the first of the (prefix_len, message, digest) `candidates`
+    accepted by `oracle`, or None. With `workers` set the oracle is queried
+    from that many threads and the remaining queries are dropped on the first hit.
+    """
+    if not workers:
+        for _, crafted_m, crafted_h in candidates:
+            if oracle(crafted_m, crafted_h):
+                return (crafted_m, crafted_h)
+        return None
+    check = lambda c: c[1:] if oracle(c[1], c[2]) else None
+    pool = ThreadPool(workers)
+    try:
+        for result in pool.imap_unordered(check, candidates):
+            if result:
+                return result
+    finally:
+        pool.terminate()
+
+def length_extend(algorithm, mac, pt, extension, oracle=None, prefix_len=None, min_prefix=0, max_prefix=999, workers=None):
+    """Extend given hex digest `mac` of hash `algorithm` (one of HASHES, e.g. 'sha256')
+    for plaintext `pt` with given `extension`.
 
     It requires a pre-defined prefix length to be specified, or an oracle
-    that returns True/False based on its validity. You can also set the 
+    that returns True/False based on its validity. You can also set the
     min/max prefix lenghts the function tests for, in the case it's unknown.
 
     The oracle receives the message that was crafted and the hex digest, in that order, all required.
-    
+    Set `workers` to query it concurrently from that many threads; the oracle must then be thread safe.
+
     Returns a tuple of the successful message/digest. If no prefix length specified
     and oracle never returned postive result it returns None.
     """
     if prefix_len is None and oracle is None:
         raise Exception("Invalid state: Need prefix length or oracle")
     if prefix_len is not None:
-        return _md4_extend(mac, pt, extension, prefix_len)
+        return _extend(_hash_class(algorithm), mac, pt, extension, prefix_len)
     else:
-        for i in xrange(min_prefix, max_prefix+1):
-            crafted_m, crafted_h = _md4_extend(mac, pt, extension, i)
-            if oracle(crafted_m, crafted_h):
-                return (crafted_m, crafted_h)
+        candidates = extend_candidates(algorithm, mac, pt, extension, min_prefix, max_prefix)
+        return _first_valid(candidates, oracle, workers)
+
+def sha1_extend_candidates(mac, pt, extension, min_prefix=0, max_prefix=999):
+    """`extend_candidates` for sha1."""
+    return extend_candidates('sha1', mac, pt, extension, min_prefix, max_prefix)
+
+def sha1_extend(mac, pt, extension, oracle=None, prefix_len=None, min_prefix=0, max_prefix=999, workers=None):
+    """Extend given sha1 hex digest `mac` for plaintext `pt` with given `extension`.
+    See `length_extend`.
+    """
+    return length_extend('sha1', mac, pt, extension, oracle, prefix_len, min_prefix, max_prefix, workers)
+
+def md4_extend_candidates(mac, pt, extension, min_prefix=0, max_prefix=999):
+    """`extend_candidates` for md4."""
+    return extend_candidates('md4', mac, pt, extension, min_prefix, max_prefix)
+
+def md4_extend(mac, pt, extension, oracle=None, prefix_len=None, min_prefix=0, max_prefix=999, workers=None):
+    """Extend given md4 hex digest `mac` for plaintext `pt` with given `extension`.
+    See `length_extend`.
+    """
+    return length_extend('md4', mac, pt, extension, oracle, prefix_len, min_prefix, max_prefix, workers)
@@ -1,2 +1,4 @@
 from sha1 import sha1
 from md4 import md4
+from md5 import md5
+from sha2 import sha256, sha512
@@ -0,0 +1,104 @@
+# Common Merkle-Damgard construction shared by the hash implementations.
+# A hash only defines its block/length field layout, initial state and
+# compression function; buffering, padding and finalization live here.
+import struct
+
+class MerkleDamgardHash(object):
+    """Base class of the hashlib-like hash implementations.
+
+    `state` resumes hashing from a given internal state (a tuple of words)
+    and `fixed_byte_len` replaces the message length used in the final padding.
+
+    Subclasses set `block_size`, `length_size` (bytes of the length field in
+    the padding), `byte_order` ('>' or '<'), `word` (struct format of a state
+    word), `initial_state` and `_compress(state, data, offset)`, which
+    processes the block of `data` at `offset` and returns the new state.
+    """
+
+    name = None
+    digest_size = None
+    block_size = 64
+    length_size = 8
+    byte_order = '>'
+    word = 'I'
+    initial_state = ()
+
+    def __init__(self, state=None, fixed_byte_len=None):
+        if state:
+            self._h = tuple(state)
+        else:
+            self._h = self.initial_state
+        self.fixed_byte_len = fixed_byte_len
+        # data that doesn't fill a block yet, always < block_size bytes
+        self._unprocessed = b''
+        # length in bytes of all data that has been processed so far
+        self._message_byte_length = 0
+
+    @classmethod
+    def padding(cls, msg_len, fixed_byte_len=None):
+        """Padding for a message of `msg_len` bytes."""
+        bit_len = (fixed_byte_len or msg_len) * 8
+        bit_len &= (1 << cls.length_size * 8) - 1
+        length = ('%0*x' % (cls.length_size * 2, bit_len)).decode('hex')
+        if cls.byte_order == '<':
+            length = length[::-1]
+        zeros = (cls.block_size - cls.length_size - 1 - msg_len) % cls.block_size
+        return b'\x80' + b'\x00'*zeros + length
+
+    @classmethod
+    def state_from_digest(cls, digest):
+        """Internal state that produced the (raw) `digest`."""
+        n = len(digest) // struct.calcsize(cls.word)
+        return struct.unpack('%s%d%s' % (cls.byte_order, n, cls.word), digest)
+
+    def update(self, arg):
+        """Update the current digest. May be called repeatedly, with str,
+        bytearray or memoryview data, or a file-like object to read from.
+        Full blocks are read in place.
+        """
+        if hasattr(arg, 'read'):
+            for data in iter(lambda: arg.read(self.block_size << 10), b''):
+                self.update(data)
+            return self
+        bsize = self.block_size
+        data = memoryview(arg)
+        offset = 0
+        if self._unprocessed:
+            offset = min(bsize - len(self._unprocessed), len(data))
+            self._unprocessed += data[:offset].tobytes()
+            if len(self._unprocessed) < bsize:
+                return self
+            self._h = self._compress(self._h, self._unprocessed, 0)
+            self._message_byte_length += bsize
+        end = offset + (len(data) - offset) // bsize * bsize
+        compress = self._compress
+        h = self._h
+        for i in xrange(offset, end, bsize):
+            h = compress(h, data, i)
+        self._h = h
+        self._message_byte_length += end - offset
+        self._unprocessed = data[end:].tobytes()
+        return self
+
+    def copy(self):
+        """Return a copy of the hash object, sharing no state with it."""
+        clone = self.__class__(self._h, self.fixed_byte_len)
+        clone._unprocessed = self._unprocessed
+        clone._message_byte_length = self._message_byte_length
+        return clone
+
+    def _produce_digest(self):
+        """Return finalized state for the data processed so far."""
+        msg_len = self._message_byte_length + len(self._unprocessed)
+        final = self._unprocessed + self.padding(msg_len, self.fixed_byte_len)
+        h = self._h
+        for i in xrange(0, len(final), self.block_size):
+            h = self._compress(h, final, i)
+        return h
+
+    def digest(self):
+        h = self._produce_digest()
+        return struct.pack('%s%d%s' % (self.byte_order, len(h), self.word), *h)[:self.digest_size]
+
+    def hexdigest(self):
+        return self.digest().encode('hex')
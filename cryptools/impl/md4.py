@@ -1,126 +1,48 @@
 # Original source and thanks to: https://gist.github.com/tristanwietsma/5937448
-# Made slight modifications to allow setting internal state
-from array import array
-from string import join
-from struct import pack, unpack
-
-_DECODE = lambda x, e: list(array('B', x.decode(e)))
-_ENCODE = lambda x, e: join([chr(i) for i in x], '').encode(e)
-HEX_TO_BYTES = lambda x: _DECODE(x, 'hex')
-TXT_TO_BYTES = lambda x: HEX_TO_BYTES(x.encode('hex'))
-BYTES_TO_HEX = lambda x: _ENCODE(x, 'hex')
-BYTES_TO_TXT = lambda x: BYTES_TO_HEX(x).decode('hex')
-
-def _pad(msg, fixed_byte_len=None):
-    n = len(msg)
-    bit_len = n * 8
-    index = (bit_len >> 3) & 0x3fL
-    pad_len = 120 - index
-    if index < 56:
-        pad_len = 56 - index
-    padding = '\x80' + '\x00'*63
-    if fixed_byte_len:
-        bit_len = fixed_byte_len * 8
-    padded_msg = msg + padding[:pad_len] + pack('<Q', bit_len)
-    return padded_msg
-
-def _left_rotate(n, b):
-    return ((n << b) | ((n & 0xffffffff) >> (32 - b))) & 0xffffffff
-
-def _f(x, y, z): return x & y | ~x & z
-def _g(x, y, z): return x & y | x & z | y & z
-def _h(x, y, z): return x ^ y ^ z
-
-def _f1(a, b, c, d, k, s, X): return _left_rotate(a + _f(b, c, d) + X[k], s)
-def _f2(a, b, c, d, k, s, X): return _left_rotate(a + _g(b, c, d) + X[k] + 0x5a827999, s)
-def _f3(a, b, c, d, k, s, X): return _left_rotate(a + _h(b, c, d) + X[k] + 0x6ed9eba1, s)
-
-class MD4Hash:
-    def __init__(self, state=None, fixed_byte_len=None):
-        if state:
-            self.A, self.B, self.C, self.D = state
-        else:
-            self.A = 0x67452301
-            self.B = 0xefcdab89
-            self.C = 0x98badcfe
-            self.D = 0x10325476
-        self.fixed_byte_len = fixed_byte_len
-
-    def update(self, message_string):
-        msg_bytes = TXT_TO_BYTES(_pad(message_string, self.fixed_byte_len))
-        for i in range(0, len(msg_bytes), 64):
-            self._compress(msg_bytes[i:i+64])
-        return self
-
-    def _compress(self, block):
-        a, b, c, d = self.A, self.B, self.C, self.D
-
-        x = []
-        for i in range(0, 64, 4):
-            x.append(unpack('<I', BYTES_TO_TXT(block[i:i+4]))[0])
-
-        a = _f1(a,b,c,d, 0, 3, x)
-        d = _f1(d,a,b,c, 1, 7, x)
-        c = _f1(c,d,a,b, 2,11, x)
-        b = _f1(b,c,d,a, 3,19, x)
-        a = _f1(a,b,c,d, 4, 3, x)
-        d = _f1(d,a,b,c, 5, 7, x)
-        c = _f1(c,d,a,b, 6,11, x)
-        b = _f1(b,c,d,a, 7,19, x)
-        a = _f1(a,b,c,d, 8, 3, x)
-        d = _f1(d,a,b,c, 9, 7, x)
-        c = _f1(c,d,a,b,10,11, x)
-        b = _f1(b,c,d,a,11,19, x)
-        a = _f1(a,b,c,d,12, 3, x)
-        d = _f1(d,a,b,c,13, 7, x)
-        c = _f1(c,d,a,b,14,11, x)
-        b = _f1(b,c,d,a,15,19, x)
-
-        a = _f2(a,b,c,d, 0, 3, x)
-        d = _f2(d,a,b,c, 4, 5, x)
-        c = _f2(c,d,a,b, 8, 9, x)
-        b = _f2(b,c,d,a,12,13, x)
-        a = _f2(a,b,c,d, 1, 3, x)
-        d = _f2(d,a,b,c, 5, 5, x)
-        c = _f2(c,d,a,b, 9, 9, x)
-        b = _f2(b,c,d,a,13,13, x)
-        a = _f2(a,b,c,d, 2, 3, x)
-        d = _f2(d,a,b,c, 6, 5, x)
-        c = _f2(c,d,a,b,10, 9, x)
-        b = _f2(b,c,d,a,14,13, x)
-        a = _f2(a,b,c,d, 3, 3, x)
-        d = _f2(d,a,b,c, 7, 5, x)
-        c = _f2(c,d,a,b,11, 9, x)
-        b = _f2(b,c,d,a,15,13, x)
-
-        a = _f3(a,b,c,d, 0, 3, x)
-        d = _f3(d,a,b,c, 8, 9, x)
-        c = _f3(c,d,a,b, 4,11, x)
-        b = _f3(b,c,d,a,12,15, x)
-        a = _f3(a,b,c,d, 2, 3, x)
-        d = _f3(d,a,b,c,10, 9, x)
-        c = _f3(c,d,a,b, 6,11, x)
-        b = _f3(b,c,d,a,14,15, x)
-        a = _f3(a,b,c,d, 1, 3, x)
-        d = _f3(d,a,b,c, 9, 9, x)
-        c = _f3(c,d,a,b, 5,11, x)
-        b = _f3(b,c,d,a,13,15, x)
-        a = _f3(a,b,c,d, 3, 3, x)
-        d = _f3(d,a,b,c,11, 9, x)
-        c = _f3(c,d,a,b, 7,11, x)
-        b = _f3(b,c,d,a,15,15, x)
-
-        # update state
-        self.A = (self.A + a) & 0xffffffff
-        self.B = (self.B + b) & 0xffffffff
-        self.C = (self.C + c) & 0xffffffff
-        self.D = (self.D + d) & 0xffffffff
-
-    def digest(self):
-        return BYTES_TO_HEX(TXT_TO_BYTES(pack('<IIII', self.A, self.B, self.C, self.D))).decode('hex')
-
-    def hexdigest(self):
-        return BYTES_TO_HEX(TXT_TO_BYTES(pack('<IIII', self.A, self.B, self.C, self.D)))
+# Made modifications to allow setting internal state and incremental hashing
+from struct import unpack_from
+
+from md import MerkleDamgardHash
+
+# (word index, shift) of every step of the three rounds
+_R1 = [(k, (3, 7, 11, 19)[k % 4]) for k in range(16)]
+_R2 = [(k, (3, 5, 9, 13)[i % 4]) for i, k in enumerate([0, 4, 8, 12, 1, 5, 9, 13,
+                                                          2, 6, 10, 14, 3, 7, 11, 15])]
+_R3 = [(k, (3, 9, 11, 15)[i % 4]) for i, k in enumerate([0, 8, 4, 12, 2, 10, 6, 14,
+                                                          1, 9, 5, 13, 3, 11, 7, 15])]
+
+def _compress(state, data, offset=0):
+    """Process the 64 byte block of `data` at `offset`; returns the new state."""
+    a, b, c, d = state
+    x = unpack_from('<16I', data, offset)
+
+    # Each step updates a, then the roles shift: (a, b, c, d) -> (d, a, b, c)
+    for k, s in _R1:
+        t = (a + (d ^ (b & (c ^ d))) + x[k]) & 0xffffffff
+        a, b, c, d = d, ((t << s) | (t >> (32 - s))) & 0xffffffff, b, c
+    for k, s in _R2:
+        t = (a + ((b & c) | (b & d) | (c & d)) + x[k] + 0x5a827999) & 0xffffffff
+        a, b, c, d = d, ((t << s) | (t >> (32 - s))) & 0xffffffff, b, c
+    for k, s in _R3:
+        t = (a + (b ^ c ^ d) + x[k] + 0x6ed9eba1) & 0xffffffff
+        a, b, c, d = d, ((t << s) | (t >> (32 - s))) & 0xffffffff, b, c
+
+    return ((state[0] + a) & 0xffffffff, (state[1] + b) & 0xffffffff,
+            (state[2] + c) & 0xffffffff, (state[3] + d) & 0xffffffff)
+
+class MD4Hash(MerkleDamgardHash):
+    """A class that mimics the hashlib api and implements the MD4 algorithm.
+
+    `state` resumes hashing from a given internal state and `fixed_byte_len`
+    replaces the message length used in the final padding.
+    """
+
+    name = 'python-md4'
+    digest_size = 16
+    block_size = 64
+    byte_order = '<'
+    initial_state = (0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476)
+    _compress = staticmethod(_compress)
 
 def md4(data, state=None, fixed_byte_len=None):
     return MD4Hash(state, fixed_byte_len).update(data)
@@ -0,0 +1,57 @@
+# MD5 (RFC 1321) on top of the common Merkle-Damgard code, with
+# injectable internal state for length extension.
+from struct import unpack_from
+
+from md import MerkleDamgardHash
+
+_K = [
+    0xd76aa478, 0xe8c7b756, 0x242070db, 0xc1bdceee, 0xf57c0faf, 0x4787c62a, 0xa8304613, 0xfd469501,
+    0x698098d8, 0x8b44f7af, 0xffff5bb1, 0x895cd7be, 0x6b901122, 0xfd987193, 0xa679438e, 0x49b40821,
+    0xf61e2562, 0xc040b340, 0x265e5a51, 0xe9b6c7aa, 0xd62f105d, 0x02441453, 0xd8a1e681, 0xe7d3fbc8,
+    0x21e1cde6, 0xc33707d6, 0xf4d50d87, 0x455a14ed, 0xa9e3e905, 0xfcefa3f8, 0x676f02d9, 0x8d2a4c8a,
+    0xfffa3942, 0x8771f681, 0x6d9d6122, 0xfde5380c, 0xa4beea44, 0x4bdecfa9, 0xf6bb4b60, 0xbebfbc70,
+    0x289b7ec6, 0xeaa127fa, 0xd4ef3085, 0x04881d05, 0xd9d4d039, 0xe6db99e5, 0x1fa27cf8, 0xc4ac5665,
+    0xf4292244, 0x432aff97, 0xab9423a7, 0xfc93a039, 0x655b59c3, 0x8f0ccc92, 0xffeff47d, 0x85845dd1,
+    0x6fa87e4f, 0xfe2ce6e0, 0xa3014314, 0x4e0811a1, 0xf7537e82, 0xbd3af235, 0x2ad7d2bb, 0xeb86d391,
+]
+
+# (constant, word index, shift) of every step of the four rounds
+_R1 = [(_K[i], i, (7, 12, 17, 22)[i % 4]) for i in range(16)]
+_R2 = [(_K[i], (5*i + 1) % 16, (5, 9, 14, 20)[i % 4]) for i in range(16, 32)]
+_R3 = [(_K[i], (3*i + 5) % 16, (4, 11, 16, 23)[i % 4]) for i in range(32, 48)]
+_R4 = [(_K[i], (7*i) % 16, (6, 10, 15, 21)[i % 4]) for i in range(48, 64)]
+
+def _compress(state, data, offset=0):
+    """Process the 64 byte block of `data` at `offset`; returns the new state."""
+    a, b, c, d = state
+    x = unpack_from('<16I', data, offset)
+
+    # Each step updates a, then the roles shift: (a, b, c, d) -> (d, a, b, c)
+    for k, i, s in _R1:
+        t = (a + (d ^ (b & (c ^ d))) + k + x[i]) & 0xffffffff
+        a, b, c, d = d, (b + ((t << s) | (t >> (32 - s)))) & 0xffffffff, b, c
+    for k, i, s in _R2:
+        t = (a + (c ^ (d & (b ^ c))) + k + x[i]) & 0xffffffff
+        a, b, c, d = d, (b + ((t << s) | (t >> (32 - s)))) & 0xffffffff, b, c
+    for k, i, s in _R3:
+        t = (a + (b ^ c ^ d) + k + x[i]) & 0xffffffff
+        a, b, c, d = d, (b + ((t << s) | (t >> (32 - s)))) & 0xffffffff, b, c
+    for k, i, s in _R4:
+        t = (a + (c ^ (b | (d ^ 0xffffffff))) + k + x[i]) & 0xffffffff
+        a, b, c, d = d, (b + ((t << s) | (t >> (32 - s)))) & 0xffffffff, b, c
+
+    return ((state[0] + a) & 0xffffffff, (state[1] + b) & 0xffffffff,
+            (state[2] + c) & 0xffffffff, (state[3] + d) & 0xffffffff)
+
+class MD5Hash(MerkleDamgardHash):
+    """A class that mimics the hashlib api and implements the MD5 algorithm."""
+
+    name = 'python-md5'
+    digest_size = 16
+    block_size = 64
+    byte_order = '<'
+    initial_state = (0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476)
+    _compress = staticmethod(_compress)
+
+def md5(data, state=None, fixed_byte_len=None):
+    return MD5Hash(state, fixed_byte_len).update(data)
@@ -1,33 +1,21 @@
 # Original source and thanks to: https://github.com/ajalt/python-sha1
 # Made some small modifications to allow setting internal state
-from __future__ import print_function
 import struct
-import io
 
-try:
-    range = xrange
-except NameError:
-    pass
+from md import MerkleDamgardHash
 
 
-def _left_rotate(n, b):
-    """Left rotate a 32-bit integer n by b bits."""
-    return ((n << b) | (n >> (32 - b))) & 0xffffffff
-
-
-def _process_chunk(chunk, h0, h1, h2, h3, h4):
-    """Process a chunk of data and return the new digest variables."""
-    assert len(chunk) == 64
-
-    w = [0] * 80
+def _compress(state, data, offset=0):
+    """Process the 64 byte block of `data` at `offset`; returns the new state."""
+    h0, h1, h2, h3, h4 = state
 
     # Break chunk into sixteen 4-byte big-endian words w[i]
-    for i in range(16):
-        w[i] = struct.unpack(b'>I', chunk[i * 4:i * 4 + 4])[0]
+    w = list(struct.unpack_from(b'>16I', data, offset))
 
     # Extend the sixteen 4-byte words into eighty 4-byte words
-    for i in range(16, 80):
-        w[i] = _left_rotate(w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16], 1)
+    for i in xrange(16, 80):
+        x = w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16]
+        w.append(((x << 1) | (x >> 31)) & 0xffffffff)
 
     # Initialize hash value for this chunk
     a = h0
@@ -36,23 +24,21 @@ def _process_chunk(chunk, h0, h1, h2, h3, h4):
     d = h3
     e = h4
 
-    for i in range(80):
-        if 0 <= i <= 19:
-            # Use alternative 1 for f from FIPS PB 180-1 to avoid bitwise not
-            f = d ^ (b & (c ^ d))
-            k = 0x5A827999
-        elif 20 <= i <= 39:
-            f = b ^ c ^ d
-            k = 0x6ED9EBA1
-        elif 40 <= i <= 59:
-            f = (b & c) | (b & d) | (c & d)
-            k = 0x8F1BBCDC
-        elif 60 <= i <= 79:
-            f = b ^ c ^ d
-            k = 0xCA62C1D6
-
-        a, b, c, d, e = ((_left_rotate(a, 5) + f + e + k + w[i]) & 0xffffffff,
-                         a, _left_rotate(b, 30), c, d)
+    # The four round groups, with the rotations inlined. Sums are only
+    # reduced to 32 bits once per round, which is equivalent mod 2**32.
+    for wi in w[0:20]:
+        # Use alternative 1 for f from FIPS PB 180-1 to avoid bitwise not
+        a, b, c, d, e = ((((a << 5) | (a >> 27)) + (d ^ (b & (c ^ d))) + e + 0x5A827999 + wi) & 0xffffffff,
+                         a, ((b << 30) | (b >> 2)) & 0xffffffff, c, d)
+    for wi in w[20:40]:
+        a, b, c, d, e = ((((a << 5) | (a >> 27)) + (b ^ c ^ d) + e + 0x6ED9EBA1 + wi) & 0xffffffff,
+                         a, ((b << 30) | (b >> 2)) & 0xffffffff, c, d)
+    for wi in w[40:60]:
+        a, b, c, d, e = ((((a << 5) | (a >> 27)) + ((b & c) | (b & d) | (c & d)) + e + 0x8F1BBCDC + wi) & 0xffffffff,
+                         a, ((b << 30) | (b >> 2)) & 0xffffffff, c, d)
+    for wi in w[60:80]:
+        a, b, c, d, e = ((((a << 5) | (a >> 27)) + (b ^ c ^ d) + e + 0xCA62C1D6 + wi) & 0xffffffff,
+                         a, ((b << 30) | (b >> 2)) & 0xffffffff, c, d)
 
     # Add this chunk's hash to result so far
     h0 = (h0 + a) & 0xffffffff
@@ -64,87 +50,20 @@ def _process_chunk(chunk, h0, h1, h2, h3, h4):
     return h0, h1, h2, h3, h4
 
 
-class Sha1Hash(object):
+class Sha1Hash(MerkleDamgardHash):
     """A class that mimics that hashlib api and implements the SHA-1 algorithm."""
 
     name = 'python-sha1'
     digest_size = 20
     block_size = 64
-
-    def __init__(self, state=None, fixed_byte_len=None):
-        # Initial digest variables
-        if state is None:
-            self._h = (
-                0x67452301,
-                0xEFCDAB89,
-                0x98BADCFE,
-                0x10325476,
-                0xC3D2E1F0,
-            )
-        else:
-            self._h = state
-        self.fixed_byte_len = fixed_byte_len
-
-        # bytes object with 0 <= len < 64 used to store the end of the message
-        # if the message length is not congruent to 64
-        self._unprocessed = b''
-        # Length in bytes of all data that has been processed so far
-        self._message_byte_length = 0
-
-    def update(self, arg):
-        """Update the current digest.
-        This may be called repeatedly, even after calling digest or hexdigest.
-        Arguments:
-            arg: bytes, bytearray, or BytesIO object to read from.
-        """
-        if isinstance(arg, (bytes, bytearray)):
-            arg = io.BytesIO(arg)
-
-        # Try to build a chunk out of the unprocessed data, if any
-        chunk = self._unprocessed + arg.read(64 - len(self._unprocessed))
-
-        # Read the rest of the data, 64 bytes at a time
-        while len(chunk) == 64:
-            self._h = _process_chunk(chunk, *self._h)
-            self._message_byte_length += 64
-            chunk = arg.read(64)
-
-        self._unprocessed = chunk
-        return self
-
-    def digest(self):
-        """Produce the final hash value (big-endian) as a bytes object"""
-        return b''.join(struct.pack(b'>I', h) for h in self._produce_digest())
-
-    def hexdigest(self):
-        """Produce the final hash value (big-endian) as a hex string"""
-        return '%08x%08x%08x%08x%08x' % self._produce_digest()
-
-    def _produce_digest(self):
-        """Return finalized digest variables for the data processed so far."""
-        # Pre-processing:
-        message = self._unprocessed
-        message_byte_length = self._message_byte_length + len(message)
-
-        # append the bit '1' to the message
-        message += b'\x80'
-
-        # append 0 <= k < 512 bits '0', so that the resulting message length (in bytes)
-        # is congruent to 56 (mod 64)
-        message += b'\x00' * ((56 - (message_byte_length + 1) % 64) % 64)
-
-        # append length of message (before pre-processing), in bits, as 64-bit big-endian integer
-        if self.fixed_byte_len:
-            message_bit_length = self.fixed_byte_len * 8
-        else:
-            message_bit_length = message_byte_length * 8
-        message += struct.pack(b'>Q', message_bit_length)
-        # Process the final chunk
-        # At this point, the length of the message is either 64 or 128 bytes.
-        h = _process_chunk(message[:64], *self._h)
-        if len(message) == 64:
-            return h
-        return _process_chunk(message[64:], *h)
+    initial_state = (
+        0x67452301,
+        0xEFCDAB89,
+        0x98BADCFE,
+        0x10325476,
+        0xC3D2E1F0,
+    )
+    _compress = staticmethod(_compress)
 
 def sha1(data, state=None, fixed_byte_len=None):
     """SHA-1 Hashing Function
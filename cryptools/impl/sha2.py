@@ -0,0 +1,111 @@
+# SHA-256 and SHA-512 (FIPS 180-4) on top of the common Merkle-Damgard
+# code, with injectable internal state for length extension.
+from struct import unpack_from
+
+from md import MerkleDamgardHash
+
+_K256 = [
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]
+
+_K512 = [
+    0x428a2f98d728ae22, 0x7137449123ef65cd, 0xb5c0fbcfec4d3b2f, 0xe9b5dba58189dbbc,
+    0x3956c25bf348b538, 0x59f111f1b605d019, 0x923f82a4af194f9b, 0xab1c5ed5da6d8118,
+    0xd807aa98a3030242, 0x12835b0145706fbe, 0x243185be4ee4b28c, 0x550c7dc3d5ffb4e2,
+    0x72be5d74f27b896f, 0x80deb1fe3b1696b1, 0x9bdc06a725c71235, 0xc19bf174cf692694,
+    0xe49b69c19ef14ad2, 0xefbe4786384f25e3, 0x0fc19dc68b8cd5b5, 0x240ca1cc77ac9c65,
+    0x2de92c6f592b0275, 0x4a7484aa6ea6e483, 0x5cb0a9dcbd41fbd4, 0x76f988da831153b5,
+    0x983e5152ee66dfab, 0xa831c66d2db43210, 0xb00327c898fb213f, 0xbf597fc7beef0ee4,
+    0xc6e00bf33da88fc2, 0xd5a79147930aa725, 0x06ca6351e003826f, 0x142929670a0e6e70,
+    0x27b70a8546d22ffc, 0x2e1b21385c26c926, 0x4d2c6dfc5ac42aed, 0x53380d139d95b3df,
+    0x650a73548baf63de, 0x766a0abb3c77b2a8, 0x81c2c92e47edaee6, 0x92722c851482353b,
+    0xa2bfe8a14cf10364, 0xa81a664bbc423001, 0xc24b8b70d0f89791, 0xc76c51a30654be30,
+    0xd192e819d6ef5218, 0xd69906245565a910, 0xf40e35855771202a, 0x106aa07032bbd1b8,
+    0x19a4c116b8d2d0c8, 0x1e376c085141ab53, 0x2748774cdf8eeb99, 0x34b0bcb5e19b48a8,
+    0x391c0cb3c5c95a63, 0x4ed8aa4ae3418acb, 0x5b9cca4f7763e373, 0x682e6ff3d6b2b8a3,
+    0x748f82ee5defb2fc, 0x78a5636f43172f60, 0x84c87814a1f0ab72, 0x8cc702081a6439ec,
+    0x90befffa23631e28, 0xa4506cebde82bde9, 0xbef9a3f7b2c67915, 0xc67178f2e372532b,
+    0xca273eceea26619c, 0xd186b8c721c0c207, 0xeada7dd6cde0eb1e, 0xf57d4f7fee6ed178,
+    0x06f067aa72176fba, 0x0a637dc5a2c898a6, 0x113f9804bef90dae, 0x1b710b35131c471b,
+    0x28db77f523047d84, 0x32caab7b40c72493, 0x3c9ebe0a15c9bebc, 0x431d67c49c100d4c,
+    0x4cc5d4becb3e42b6, 0x597f299cfc657e2a, 0x5fcb6fab3ad6faec, 0x6c44198c4a475817,
+]
+
+def _compress256(state, data, offset=0):
+    """Process the 64 byte block of `data` at `offset`; returns the new state."""
+    w = list(unpack_from('>16I', data, offset))
+    for i in xrange(16, 64):
+        x = w[i-15]
+        y = w[i-2]
+        # Rotations are left unmasked; the high bits they leave behind
+        # are multiples of 2**32 and vanish with the final mask.
+        w.append((w[i-16] + w[i-7] +
+                  ((x >> 7 | x << 25) ^ (x >> 18 | x << 14) ^ (x >> 3)) +
+                  ((y >> 17 | y << 15) ^ (y >> 19 | y << 13) ^ (y >> 10))) & 0xffffffff)
+
+    a, b, c, d, e, f, g, h = state
+    for k, wi in zip(_K256, w):
+        t1 = (h + ((e >> 6 | e << 26) ^ (e >> 11 | e << 21) ^ (e >> 25 | e << 7)) +
+              (g ^ (e & (f ^ g))) + k + wi)
+        t2 = ((a >> 2 | a << 30) ^ (a >> 13 | a << 19) ^ (a >> 22 | a << 10)) + ((a & b) | (c & (a | b)))
+        a, b, c, d, e, f, g, h = (t1 + t2) & 0xffffffff, a, b, c, (d + t1) & 0xffffffff, e, f, g
+
+    return tuple([(x + y) & 0xffffffff for x, y in zip(state, (a, b, c, d, e, f, g, h))])
+
+def _compress512(state, data, offset=0):
+    """Process the 128 byte block of `data` at `offset`; returns the new state."""
+    w = list(unpack_from('>16Q', data, offset))
+    for i in xrange(16, 80):
+        x = w[i-15]
+        y = w[i-2]
+        w.append((w[i-16] + w[i-7] +
+                  ((x >> 1 | x << 63) ^ (x >> 8 | x << 56) ^ (x >> 7)) +
+                  ((y >> 19 | y << 45) ^ (y >> 61 | y << 3) ^ (y >> 6))) & 0xffffffffffffffff)
+
+    a, b, c, d, e, f, g, h = state
+    for k, wi in zip(_K512, w):
+        t1 = (h + ((e >> 14 | e << 50) ^ (e >> 18 | e << 46) ^ (e >> 41 | e << 23)) +
+              (g ^ (e & (f ^ g))) + k + wi)
+        t2 = ((a >> 28 | a << 36) ^ (a >> 34 | a << 30) ^ (a >> 39 | a << 25)) + ((a & b) | (c & (a | b)))
+        a, b, c, d, e, f, g, h = (t1 + t2) & 0xffffffffffffffff, a, b, c, (d + t1) & 0xffffffffffffffff, e, f, g
+
+    return tuple([(x + y) & 0xffffffffffffffff for x, y in zip(state, (a, b, c, d, e, f, g, h))])
+
+class SHA256Hash(MerkleDamgardHash):
+    """A class that mimics the hashlib api and implements the SHA-256 algorithm."""
+
+    name = 'python-sha256'
+    digest_size = 32
+    block_size = 64
+    initial_state = (
+        0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
+        0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+    )
+    _compress = staticmethod(_compress256)
+
+class SHA512Hash(MerkleDamgardHash):
+    """A class that mimics the hashlib api and implements the SHA-512 algorithm."""
+
+    name = 'python-sha512'
+    digest_size = 64
+    block_size = 128
+    length_size = 16
+    word = 'Q'
+    initial_state = (
+        0x6a09e667f3bcc908, 0xbb67ae8584caa73b, 0x3c6ef372fe94f82b, 0xa54ff53a5f1d36f1,
+        0x510e527fade682d1, 0x9b05688c2b3e6c1f, 0x1f83d9abfb41bd6b, 0x5be0cd19137e2179,
+    )
+    _compress = staticmethod(_compress512)
+
+def sha256(data, state=None, fixed_byte_len=None):
+    return SHA256Hash(state, fixed_byte_len).update(data)
+
+def sha512(data, state=None, fixed_byte_len=None):
+    return SHA512Hash(state, fixed_byte_len).update(data)
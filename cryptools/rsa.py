@@ -1,4 +1,12 @@
+import os
+import time
+import tempfile
+import multiprocessing
+import cPickle as pickle
+from collections import OrderedDict
+
 import cryptomath as m
+import factor
 
 from Crypto.PublicKey import RSA
 
@@ -12,3 +20,255 @@ def common_factor_attack(pub1, pub2):
     if gcd > 1:
         return (construct_private(gcd, pub1.n/gcd, pub1.e),
                 construct_private(gcd, pub2.n/gcd, pub2.e))
+
+def factor_attack(pub, methods=None, timeout=60, workers=None):
+    """Factors the modulus of public key `pub` with `factor.factorize` (Fermat,
+    Pollard p-1 and rho by default) and constructs the private key.
+    Returns None if no method succeeded in time.
+    """
+    result = factor.factorize(pub.n, methods, timeout, workers)
+    if result:
+        p, q, _ = result
+        return construct_private(p, q, pub.e)
+
+class _TreeLevels(object):
+    """Levels of a product tree, leaves first. With `spill_dir` set every level
+    is pickled to a temporary file in that directory as soon as it's added,
+    so only the level being worked on stays in memory.
+    """
+
+    def __init__(self, spill_dir=None):
+        self.spill_dir = spill_dir
+        self._levels = []
+
+    def append(self, level):
+        if self.spill_dir is not None:
+            fd, path = tempfile.mkstemp(prefix='ptree', dir=self.spill_dir)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(level, f, pickle.HIGHEST_PROTOCOL)
+            level = path
+        self._levels.append(level)
+
+    def __len__(self):
+        return len(self._levels)
+
+    def __getitem__(self, i):
+        level = self._levels[i]
+        if self.spill_dir is not None:
+            with open(level, 'rb') as f:
+                level = pickle.load(f)
+        return level
+
+    def remove(self):
+        """Delete the spilled levels, if any."""
+        if self.spill_dir is not None:
+            for path in self._levels:
+                if os.path.exists(path):
+                    os.remove(path)
+        self._levels = []
+
+def _product_tree(values, spill_dir=None):
+    """Levels of the product tree of `values` and its root. An odd value out
+    is carried up to the next level as is.
+    """
+    levels = _TreeLevels(spill_dir)
+    level = list(values)
+    levels.append(level)
+    while len(level) > 1:
+        odd = level[len(level) & ~1:]
+        level = [level[i] * level[i+1] for i in xrange(0, len(level) - 1, 2)] + odd
+        levels.append(level)
+    return levels, level[0]
+
+def _remainder_tree(levels, remainder=None):
+    """Descends the remainder tree of `levels` from `remainder`, the product
+    of all moduli reduced mod the square of the root (the root itself by default).
+    Returns the leaves and that product reduced mod the square of every leaf.
+    """
+    level = levels[len(levels) - 1]
+    rems = [level[0] if remainder is None else remainder]
+    for depth in xrange(len(levels) - 2, -1, -1):
+        level = levels[depth]
+        rems = [rems[i >> 1] % (x * x) for i, x in enumerate(level)]
+    return level, rems
+
+def _leaf_gcds(levels, remainder=None):
+    leaves, rems = _remainder_tree(levels, remainder)
+    return [m.gcd(r // n, n) for r, n in zip(rems, leaves)]
+
+def _subtree_product(args):
+    chunk, spill_dir = args
+    levels, root = _product_tree(chunk, spill_dir)
+    # without spilling the tree is cheaper to rebuild than to send back
+    return root, levels if spill_dir is not None else None
+
+def _subtree_gcds(args):
+    chunk, levels, remainder = args
+    if levels is None:
+        levels, _ = _product_tree(chunk)
+    try:
+        return _leaf_gcds(levels, remainder)
+    finally:
+        levels.remove()
+
+def batch_gcd(moduli, workers=None, spill_dir=None):
+    """Bernstein's batch GCD: the gcd of every modulus in `moduli` with the
+    product of all the others, in the order given, in quasi-linear time.
+    Anything above 1 is a shared factor (or the modulus itself, if both of
+    its primes are shared or it's repeated).
+
+    With `workers` set the moduli are split in that many subtrees, built and
+    descended in a process pool; only their roots are combined here.
+    With `spill_dir` set the tree levels are pickled to temporary files in
+    that directory instead of kept in memory.
+    """
+    moduli = [m.mpz(n) for n in moduli]
+    if not moduli:
+        return []
+    if not workers or workers < 2 or len(moduli) < 2 * workers:
+        levels, _ = _product_tree(moduli, spill_dir)
+        try:
+            return _leaf_gcds(levels)
+        finally:
+            levels.remove()
+    size = -(-len(moduli) // workers)
+    chunks = [moduli[i:i+size] for i in xrange(0, len(moduli), size)]
+    pool = multiprocessing.Pool(workers)
+    subtrees = []
+    try:
+        subtrees = pool.map(_subtree_product, [(c, spill_dir) for c in chunks])
+        top, _ = _product_tree([root for root, _ in subtrees])
+        _, rems = _remainder_tree(top)
+        jobs = [(None if levels else chunk, levels, r)
+                for chunk, (_, levels), r in zip(chunks, subtrees, rems)]
+        return [g for gcds in pool.map(_subtree_gcds, jobs) for g in gcds]
+    finally:
+        pool.terminate()
+        for _, levels in subtrees:
+            if levels:
+                levels.remove()
+
+def _read_moduli(path):
+    """Moduli in file `path`, one per line: decimal, or hex starting with 0x."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield long(line, 16 if line[:2].lower() == '0x' else 10)
+
+def _public_keys(keys, e):
+    if isinstance(keys, basestring):
+        keys = _read_moduli(keys)
+    for key in keys:
+        if isinstance(key, (int, long)):
+            yield key, e
+        else:
+            yield key.n, key.e
+
+def batch_common_factor_attack(keys, e=65537, workers=None, spill_dir=None):
+    """`common_factor_attack` for any number of keys at once, through `batch_gcd`.
+
+    `keys` is an iterable of public keys or moduli, or the path of a file
+    with one modulus per line (decimal, or hex starting with 0x). Moduli
+    without a key use public exponent `e`. `workers` and `spill_dir` are
+    passed on to `batch_gcd`.
+
+    Returns an (index, private key) tuple for every key that shares a prime
+    with another one, in order. Repeated moduli that share nothing else
+    can't be split and are left out.
+    """
+    keys = list(_public_keys(keys, e))
+    gcds = batch_gcd([n for n, _ in keys], workers, spill_dir)
+    hits = [i for i, g in enumerate(gcds) if g > 1]
+    found = []
+    for i in hits:
+        n, exp = keys[i]
+        p = gcds[i]
+        if p == n:
+            # both primes shared, or n repeated: split it against the other hits
+            p = next((g for g in (m.gcd(n, keys[j][0]) for j in hits) if 1 < g < n), None)
+            if p is None:
+                continue
+        found.append((i, construct_private(p, n // p, exp)))
+    return found
+
+def small_message_attack(c, e=3):
+    """Plaintext of unpadded RSA ciphertext `c` when m**e is smaller than
+    the modulus, so the encryption never wrapped around: the e-th root of c.
+    Returns None if c isn't an exact e-th power.
+    """
+    pt = m.iroot(c, e)
+    if pow(pt, e) == c:
+        return pt
+
+def hastad_broadcast(pairs, e=3, crt=None):
+    """Hastad's broadcast attack: recovers the message encrypted with public
+    exponent `e` under several moduli, from (n, c) `pairs`. e pairs are always
+    enough, fewer work for small messages. `crt` can be a `cryptomath.CRT`
+    for the moduli of `pairs`, to reuse its precomputed constants.
+
+    Returns the plaintext as an integer, or None.
+    """
+    solver = crt or m.CRT([n for n, _ in pairs])
+    return small_message_attack(solver.solve([c for _, c in pairs]), e)
+
+# CRT solvers by moduli set, so groups broadcast to the same keys share them
+_CRT_SOLVERS = {}
+_CRT_SOLVERS_MAX = 1024
+
+def _crt_solver(moduli):
+    solver = _CRT_SOLVERS.get(moduli)
+    if solver is None:
+        if len(_CRT_SOLVERS) >= _CRT_SOLVERS_MAX:
+            _CRT_SOLVERS.clear()
+        solver = _CRT_SOLVERS[moduli] = m.CRT(moduli)
+    return solver
+
+def _broadcast_groups(captures):
+    """{(e, label): [(n, c)]} of (label, key, ciphertext) `captures`, one
+    ciphertext per modulus, in the order the groups were first seen.
+    """
+    groups = OrderedDict()
+    for label, key, c in captures:
+        n, e = key if isinstance(key, tuple) else (key.n, key.e)
+        if isinstance(c, basestring):
+            c = long(c.encode('hex') or '0', 16)
+        groups.setdefault((e, label), OrderedDict())[n] = c
+    return [(k, group.items()) for k, group in groups.iteritems()]
+
+def _broadcast_job(args):
+    (e, label), pairs = args
+    start = time.time()
+    # the same e moduli for every group sent to the same keys
+    pairs = sorted(pairs)[:e]
+    try:
+        pt = hastad_broadcast(pairs, e, _crt_solver(tuple(n for n, _ in pairs)))
+    except m.NotCoprimeError:
+        pt = None
+    return (label, e, pt, time.time() - start)
+
+def batch_broadcast_attack(captures, workers=None):
+    """Runs `hastad_broadcast` over many captured ciphertexts at once.
+
+    `captures` is an iterable of (label, public key, ciphertext) tuples. The
+    label identifies the message (anything hashable), the key is a public
+    key or an (n, e) tuple and the ciphertext an integer or a byte string.
+    Captures are grouped by exponent and label and every group is solved
+    with up to e of its moduli; a group with a single modulus is the plain
+    e-th root attack. The CRT constants are computed once per moduli set.
+
+    With `workers` set the groups are solved in a process pool of that size.
+
+    Returns a (label, e, plaintext, seconds) tuple per group, in the order
+    they were first seen. The plaintext is an integer, or None if the attack
+    failed, and seconds is the time the attack took.
+    """
+    jobs = _broadcast_groups(captures)
+    if not workers:
+        return map(_broadcast_job, jobs)
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(_broadcast_job, jobs)
+    finally:
+        pool.close()
+        pool.join()